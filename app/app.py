@@ -26,14 +26,28 @@ All /api/* endpoints accept optional query params:
   limit       — result limit (default 100)
   min_amount  — minimum USDC trade size
   wallet      — filter by wallet address
+
+/api/trades and /api/whales also stream JSON Lines (one trade per line)
+when called with `?format=ndjson` or `Accept: application/x-ndjson`.
+/api/trades, /api/whales and /api/wallets return MessagePack when the
+client prefers `application/msgpack` in its Accept header.
 """
 
-import io
+import functools
+import glob
+import hashlib
 import logging
+import math
 import os
-from datetime import datetime, timezone
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, Optional, Tuple
 
-from flask import Flask, jsonify, render_template, request, Response
+import msgpack
+import orjson
+from flask import Flask, abort, g, jsonify, render_template, request, Response, send_file
+from flask_orjson import OrjsonProvider
 
 from conf.config import Config
 from db import Database
@@ -41,11 +55,102 @@ from services.analysis import AnalysisService
 
 logger = logging.getLogger(__name__)
 
+_HERE         = os.path.dirname(__file__)
+_TEMPLATE_DIR = os.path.join(_HERE, "templates")
+_STATIC_DIR   = os.path.join(_HERE, "static")
+
+# Accepted shapes for numeric query params. Anything else falls back to
+# the default; the length cap also bounds int() on hostile input.
+_INT_RE   = re.compile(r"\A\d{1,6}\Z")
+_FLOAT_RE = re.compile(r"\A\d{1,12}(?:\.\d{1,8})?\Z")
+
 # Service refs — set by run.py; accessed by the status endpoint
 _ingestion_ref       = None
 _wallet_analyzer_ref = None
 _market_analyzer_ref = None
 
+# Per-view LRU size for serialized aggregate bodies. Entries are keyed by
+# data generation, so stale ones are never hit again and simply age out.
+_CACHE_MAXSIZE = 512
+
+# Response formats offered by _rows_response, in server preference order
+_ROW_MIMETYPES = ["application/json", "application/msgpack"]
+
+# Last /api/status body; reused for up to _STATUS_TTL seconds while the
+# service counters it reports are unchanged.
+_STATUS_TTL = 1.0
+_status_cache: Dict[str, object] = {"ts": 0.0, "key": None, "body": b""}
+
+# Second-granularity UTC stamps: strftime format → (epoch_second, text)
+_utc_stamps: Dict[str, Tuple[int, str]] = {}
+
+# Worker threads for overlapping independent DB reads within one request.
+# Each read checks out its own pooled read-only SQLite connection and
+# sqlite3 releases the GIL while a query runs, so the reads genuinely
+# proceed in parallel.  run.py sizes the Database read pool to cover
+# these on top of the web threads.
+READ_FANOUT_WORKERS = 4
+_read_pool = ThreadPoolExecutor(
+    max_workers=READ_FANOUT_WORKERS, thread_name_prefix="api-read"
+)
+
+
+def _trades_watermark() -> Optional[int]:
+    """
+    Monotonic count of ingested trades; changes whenever new trades land.
+    None without an ingestion service to report it.
+    """
+    return _ingestion_ref.new_trades_total if _ingestion_ref else None
+
+
+def _utc_stamp(fmt: str) -> str:
+    """Current UTC time formatted with `fmt`, reformatted at most once per second."""
+    now = int(time.time())
+    hit = _utc_stamps.get(fmt)
+    if hit is not None and hit[0] == now:
+        return hit[1]
+    text = time.strftime(fmt, time.gmtime(now))
+    _utc_stamps[fmt] = (now, text)
+    return text
+
+
+def _markets_generation() -> Optional[int]:
+    """
+    Market analyzer run count; changes whenever market metadata is
+    refreshed.  None without a market analyzer to report it.
+    """
+    return _market_analyzer_ref.run_count if _market_analyzer_ref else None
+
+
+def _cached(
+    key_fn: Callable[[], tuple],
+    ttl: float,
+    gen_fn: Callable[[], Optional[int]] = _trades_watermark,
+):
+    """
+    Memoize a view's JSON body per (generation, request key).
+
+    The wrapped view returns a plain dict / list; the cache stores the
+    orjson-encoded bytes so a hit skips both the DB query and the encode.
+    `gen_fn` returns a counter the owning service bumps whenever the
+    underlying data changes, so a new generation simply misses, and old
+    keys fall out under LRU pressure.  When no service reports one
+    (gen_fn returns None), entries expire every `ttl` seconds instead.
+    """
+    def decorator(view):
+        @functools.lru_cache(maxsize=_CACHE_MAXSIZE)
+        def render(gen: Hashable, key: tuple) -> bytes:
+            return orjson.dumps(view())
+
+        @functools.wraps(view)
+        def wrapper():
+            gen = gen_fn()
+            if gen is None:
+                gen = ("ttl", int(time.monotonic() // ttl))
+            return Response(render(gen, key_fn()), mimetype="application/json")
+        return wrapper
+    return decorator
+
 
 def create_app(
     config: Config,
@@ -72,49 +177,156 @@ def create_app(
     _wallet_analyzer_ref = wallet_analyzer
     _market_analyzer_ref = market_analyzer
 
-    template_dir = os.path.join(os.path.dirname(__file__), "templates")
-    static_dir = os.path.join(os.path.dirname(__file__), "static")
-
     app = Flask(
         __name__,
-        template_folder=template_dir,
-        static_folder=static_dir,
+        template_folder=_TEMPLATE_DIR,
+        static_folder=_STATIC_DIR,
     )
-    app.config["JSON_SORT_KEYS"] = False
+    # X-Sendfile hands CSV exports to a fronting nginx / uwsgi for
+    # zero-copy transfer; only valid when such a proxy is present.
+    app.config["USE_X_SENDFILE"] = config.use_x_sendfile
+    # orjson: C-backed encoder, writes UTF-8 bytes directly and does not
+    # sort keys (sorting alone is a measurable cost on large payloads).
+    app.json = OrjsonProvider(app)
+
+    # Bind per-request config values once; routes capture plain locals
+    default_market_id = config.market_id or None
+    whale_threshold   = config.whale_threshold
 
     # ----------------------------------------------------------------
     # Helpers
     # ----------------------------------------------------------------
 
-    def _market_id() -> str:
-        """Use query-param market_id if provided, else fall back to config."""
-        return request.args.get("market_id", "") or config.market_id or ""
+    @app.before_request
+    def _parse_args() -> None:
+        """Parse the common query params once per request into flask.g."""
+        args = request.args
+
+        # Query-param market_id if provided, else fall back to config
+        g.market_id = args.get("market_id") or default_market_id
+        g.wallet    = args.get("wallet") or None
+
+        m = _INT_RE.match(args.get("limit", ""))
+        g.limit_raw = int(m.group()) if m else None
+
+        m = _FLOAT_RE.match(args.get("min_amount", ""))
+        g.min_amount = float(m.group()) if m else None
 
     def _limit(default: int = 100, cap: int = 1_000) -> int:
+        raw = g.limit_raw
+        return default if raw is None else min(raw, cap)
+
+    def _after() -> Optional[Tuple[float, str]]:
+        """
+        Keyset cursor from ?after=<sort value>:<wallet> — the last row of
+        the previous page.  Every sort column is numeric (last_seen is an
+        epoch), so the value must be a finite number; a malformed cursor
+        is a 400 rather than a silent restart at the first page.
+        """
+        raw = request.args.get("after")
+        if not raw:
+            return None
+        value, sep, wallet = raw.rpartition(":")
         try:
-            return min(int(request.args.get("limit", default)), cap)
+            number = float(value)
         except ValueError:
-            return default
+            number = math.nan
+        if not sep or not wallet or not math.isfinite(number):
+            abort(400, description="after must be <number>:<wallet>")
+        return number, wallet
+
+    def _wants_ndjson() -> bool:
+        return (
+            request.args.get("format") == "ndjson"
+            or request.accept_mimetypes.best == "application/x-ndjson"
+        )
 
-    def _min_amount() -> float | None:
-        val = request.args.get("min_amount")
-        try:
-            return float(val) if val is not None else None
-        except ValueError:
-            return None
+    def _ndjson(rows) -> Response:
+        """Stream rows as JSON Lines straight from the DB cursor."""
+        return Response(
+            (orjson.dumps(row) + b"\n" for row in rows),
+            mimetype="application/x-ndjson",
+        )
+
+    def _rows_response(rows) -> Response:
+        """JSON by default; MessagePack for clients that prefer it."""
+        if request.accept_mimetypes.best_match(_ROW_MIMETYPES) == "application/msgpack":
+            return Response(
+                msgpack.packb(rows, use_bin_type=True),
+                mimetype="application/msgpack",
+            )
+        return jsonify(rows)
+
+    def _cache_key() -> tuple:
+        args = request.args
+        return (
+            g.market_id,
+            args.get("limit"),
+            args.get("min_amount"),
+            args.get("order_by"),
+            args.get("after"),
+        )
+
+    cache_ttl = config.fetch_interval
+
+    # Cache-Control max-age per endpoint: aggregates change at most once
+    # per poll; status is kept short so health probes stay current.
+    cache_max_age = {
+        "/api/stats":   cache_ttl,
+        "/api/volume":  cache_ttl,
+        "/api/traders": cache_ttl,
+        "/api/markets": cache_ttl,
+        "/api/status":  1,
+    }
+
+    @app.after_request
+    def _add_cache_headers(response: Response) -> Response:
+        """
+        Tag JSON responses with a weak ETag and answer a matching
+        If-None-Match with an empty 304, so pollers and proxies skip
+        re-downloading unchanged bodies.
+        """
+        if (
+            request.method != "GET"
+            or response.status_code != 200
+            or response.is_streamed
+            or response.direct_passthrough
+            or response.mimetype != "application/json"
+        ):
+            return response
+
+        etag = hashlib.blake2b(response.get_data(), digest_size=8).hexdigest()
+        response.set_etag(etag, weak=True)
+        max_age = cache_max_age.get(request.path)
+        if max_age is not None:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        return response.make_conditional(request)
+
+    # Absolute: send_file resolves relative paths against app.root_path
+    export_dir = os.path.abspath(os.path.join(config.output_dir, "exports"))
 
     # ----------------------------------------------------------------
     # Pages
     # ----------------------------------------------------------------
 
-    @app.route("/")
-    def index():
-        return render_template(
+    # Template inputs only change on restart — render once, serve bytes.
+    with app.app_context():
+        index_html = render_template(
             "index.html",
             market_id=config.market_id,
             whale_threshold=config.whale_threshold,
             fetch_interval=config.fetch_interval,
-        )
+        ).encode("utf-8")
+        wallet_html = render_template(
+            "wallet_dashboard.html",
+            address="",
+            whale_threshold=config.whale_threshold,
+        ).encode("utf-8")
+
+    @app.route("/")
+    def index():
+        return Response(index_html, mimetype="text/html")
 
     # ----------------------------------------------------------------
     # API — trades
@@ -122,36 +334,44 @@ def create_app(
 
     @app.route("/api/trades")
     def api_trades():
-        trades = db.get_recent_trades(
+        # Rows come back annotated with the classify_trade fields
+        params = dict(
             limit=_limit(),
-            market_id=_market_id() or None,
-            min_amount=_min_amount(),
-            wallet=request.args.get("wallet") or None,
+            market_id=g.market_id,
+            min_amount=g.min_amount,
+            wallet=g.wallet,
+        )
+        if _wants_ndjson():
+            return _ndjson(analysis.iter_recent_trades(**params))
+        if request.accept_mimetypes.best_match(_ROW_MIMETYPES) == "application/msgpack":
+            return _rows_response(analysis.get_recent_trades(**params))
+        # JSON array built by SQLite; sent as-is
+        return Response(
+            analysis.get_recent_trades_json(**params),
+            mimetype="application/json",
         )
-        # Annotate each trade with derived fields
-        trades = [analysis.classify_trade(t) for t in trades]
-        return jsonify(trades)
 
     # ----------------------------------------------------------------
     # API — stats
     # ----------------------------------------------------------------
 
     @app.route("/api/stats")
+    @_cached(_cache_key, cache_ttl)
     def api_stats():
-        summary = analysis.get_summary(_market_id() or None)
-        return jsonify(summary)
+        return analysis.get_summary(g.market_id)
 
     # ----------------------------------------------------------------
     # API — traders
     # ----------------------------------------------------------------
 
     @app.route("/api/traders")
+    @_cached(_cache_key, cache_ttl)
     def api_traders():
-        traders = analysis.get_top_traders(
-            market_id=_market_id() or None,
+        return analysis.get_top_traders(
+            market_id=g.market_id,
             limit=_limit(default=20, cap=100),
+            after=_after(),
         )
-        return jsonify(traders)
 
     # ----------------------------------------------------------------
     # API — whales
@@ -159,21 +379,28 @@ def create_app(
 
     @app.route("/api/whales")
     def api_whales():
+        limit = _limit(default=50, cap=500)
+        if _wants_ndjson():
+            return _ndjson(analysis.iter_recent_trades(
+                market_id=g.market_id,
+                limit=limit,
+                min_amount=analysis.whale_threshold,
+            ))
         trades = analysis.get_whale_trades(
-            market_id=_market_id() or None,
-            limit=_limit(default=50, cap=500),
+            market_id=g.market_id,
+            limit=limit,
         )
-        trades = [analysis.classify_trade(t) for t in trades]
-        return jsonify(trades)
+        return _rows_response(trades)
 
     # ----------------------------------------------------------------
     # API — volume breakdown
     # ----------------------------------------------------------------
 
     @app.route("/api/volume")
+    @_cached(_cache_key, cache_ttl)
     def api_volume():
-        summary = analysis.get_summary(_market_id() or None)
-        return jsonify(summary.get("volume_by_outcome", []))
+        summary = analysis.get_summary(g.market_id)
+        return summary.get("volume_by_outcome", [])
 
     # ----------------------------------------------------------------
     # API — CSV export
@@ -181,31 +408,55 @@ def create_app(
 
     @app.route("/api/export/csv")
     def api_export_csv():
-        market_id = _market_id() or None
-        min_amount = _min_amount()
+        market_id = g.market_id
+        min_amount = g.min_amount
         limit = _limit(default=10_000, cap=100_000)
 
-        csv_bytes = db.export_csv_bytes(
-            market_id=market_id,
-            min_amount=min_amount,
-            limit=limit,
-        )
-
-        if not csv_bytes:
-            return jsonify({"error": "No trades match the filter criteria"}), 404
-
-        ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+        # Exports are cached on disk per filter set and rebuilt once new
+        # trades arrive (or the file is older than one poll interval).
+        # send_file(conditional=True) lets the server use sendfile(2) and
+        # answer Range / If-Modified-Since requests.
+        params_key = hashlib.blake2b(
+            repr((market_id, min_amount, limit)).encode(), digest_size=8
+        ).hexdigest()
         mid = market_id or "all"
-        filename = f"trades_{mid[:16]}_{ts}.csv"
-
-        return Response(
-            csv_bytes,
-            mimetype="text/csv",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"',
-                "Content-Length": str(len(csv_bytes)),
-            },
-        )
+        filename = f"trades_{mid[:16]}_{_utc_stamp('%Y%m%d_%H%M%S')}.csv"
+
+        # A concurrent request that rebuilt the export for newer trades
+        # sweeps the older files, possibly between our freshness check and
+        # send_file opening the path; the second pass then serves (or
+        # rebuilds) the export at the current watermark.
+        for attempt in range(2):
+            path = os.path.join(
+                export_dir, f"trades_{params_key}_{_trades_watermark() or 0}.csv"
+            )
+            try:
+                fresh = time.time() - os.path.getmtime(path) < cache_ttl
+            except OSError:
+                fresh = False
+
+            if not fresh:
+                if db.export_csv(path, market_id=market_id,
+                                 min_amount=min_amount, limit=limit) == 0:
+                    return jsonify({"error": "No trades match the filter criteria"}), 404
+                for stale in glob.glob(os.path.join(export_dir, f"trades_{params_key}_*.csv")):
+                    if stale != path:
+                        try:
+                            os.remove(stale)
+                        except OSError:
+                            pass
+
+            try:
+                return send_file(
+                    path,
+                    mimetype="text/csv",
+                    as_attachment=True,
+                    download_name=filename,
+                    conditional=True,
+                )
+            except FileNotFoundError:
+                if attempt:
+                    raise
 
     # ----------------------------------------------------------------
     # Page — wallet dashboard
@@ -214,10 +465,12 @@ def create_app(
     @app.route("/wallet-dashboard")
     def wallet_dashboard():
         address = request.args.get("address", "")
+        if not address:
+            return Response(wallet_html, mimetype="text/html")
         return render_template(
             "wallet_dashboard.html",
             address=address,
-            whale_threshold=config.whale_threshold,
+            whale_threshold=whale_threshold,
         )
 
     # ----------------------------------------------------------------
@@ -226,24 +479,25 @@ def create_app(
 
     @app.route("/api/wallet/<address>")
     def api_wallet(address: str):
-        wallet = db.get_wallet(address)
+        wallet_f    = _read_pool.submit(db.get_wallet, address)
+        positions_f = _read_pool.submit(db.get_positions_for_wallet, address)
+        trades_f    = _read_pool.submit(
+            analysis.get_recent_trades,
+            limit=_limit(default=50, cap=200),
+            wallet=address,
+        )
+
+        wallet = wallet_f.result()
         if wallet is None:
             return jsonify({
                 "error": "No data found for this wallet. "
                          "It may not have any trades yet or the analyzer hasn't run."
             }), 404
 
-        positions = db.get_positions_for_wallet(address)
-        trades    = db.get_recent_trades(
-            limit=_limit(default=50, cap=200),
-            wallet=address,
-        )
-        trades = [analysis.classify_trade(t) for t in trades]
-
         return jsonify({
             "wallet":    wallet,
-            "positions": positions,
-            "trades":    trades,
+            "positions": positions_f.result(),
+            "trades":    trades_f.result(),
         })
 
     # ----------------------------------------------------------------
@@ -252,26 +506,24 @@ def create_app(
 
     @app.route("/api/wallets")
     def api_wallets():
-        _valid_order = {"total_volume", "realized_pnl", "total_trades", "last_seen"}
-        order_by  = request.args.get("order_by", "total_volume")
-        if order_by not in _valid_order:
-            order_by = "total_volume"
-
+        # Unknown order_by values are mapped to total_volume by the DB layer
+        order_by = request.args.get("order_by", "total_volume")
         wallets = db.get_wallets(
             limit=_limit(default=50, cap=200),
             order_by=order_by,
-            min_volume=_min_amount(),
+            min_volume=g.min_amount,
+            after=_after(),
         )
-        return jsonify(wallets)
+        return _rows_response(wallets)
 
     # ----------------------------------------------------------------
     # API — markets metadata
     # ----------------------------------------------------------------
 
     @app.route("/api/markets")
+    @_cached(_cache_key, cache_ttl, _markets_generation)
     def api_markets():
-        markets = db.get_markets(limit=_limit(default=50, cap=200))
-        return jsonify(markets)
+        return db.get_markets(limit=_limit(default=50, cap=200))
 
     # ----------------------------------------------------------------
     # API — service status
@@ -282,10 +534,22 @@ def create_app(
         ing  = _ingestion_ref
         wa   = _wallet_analyzer_ref
         ma   = _market_analyzer_ref
+
+        now = time.monotonic()
+        key = (
+            ing.poll_count   if ing else None,
+            ing.ws_connected if ing else None,
+            wa.run_count     if wa else None,
+            ma.run_count     if ma else None,
+        )
+        cached = _status_cache
+        if now - cached["ts"] < _STATUS_TTL and cached["key"] == key:
+            return Response(cached["body"], mimetype="application/json")
+
         status = {
             "status": "ok",
-            "market_id": config.market_id,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "market_id": default_market_id or "",
+            "timestamp": _utc_stamp("%Y-%m-%dT%H:%M:%S+00:00"),
             "ingestion": {
                 "ws_connected":    ing.ws_connected    if ing else None,
                 "poll_count":      ing.poll_count      if ing else None,
@@ -301,12 +565,18 @@ def create_app(
                 "last_run":   ma.last_run_ts if ma else None,
             },
         }
-        return jsonify(status)
+        body = orjson.dumps(status)
+        _status_cache.update(ts=now, key=key, body=body)
+        return Response(body, mimetype="application/json")
 
     # ----------------------------------------------------------------
     # Error handlers
     # ----------------------------------------------------------------
 
+    @app.errorhandler(400)
+    def bad_request(e):
+        return jsonify({"error": e.description}), 400
+
     @app.errorhandler(404)
     def not_found(e):
         return jsonify({"error": "not found"}), 404
@@ -14,7 +14,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
     # --- Market ---
     market_id: str
@@ -38,6 +38,8 @@ class Config:
     flask_host: str
     flask_port: int
     flask_debug: bool
+    web_threads: int             # gunicorn gthread worker threads
+    use_x_sendfile: bool         # only behind nginx / uwsgi that honour X-Sendfile
 
     # --- Phase 2: Analyzer intervals ---
     wallet_analyzer_interval: int   # seconds between wallet aggregation runs
@@ -70,6 +72,8 @@ class Config:
             flask_host=os.getenv("FLASK_HOST", "0.0.0.0"),
             flask_port=int(os.getenv("FLASK_PORT", "5000")),
             flask_debug=os.getenv("FLASK_DEBUG", "false").lower() == "true",
+            web_threads=int(os.getenv("WEB_THREADS", "8")),
+            use_x_sendfile=os.getenv("USE_X_SENDFILE", "false").lower() == "true",
             wallet_analyzer_interval=int(os.getenv("WALLET_ANALYZER_INTERVAL", "300")),
             market_analyzer_interval=int(os.getenv("MARKET_ANALYZER_INTERVAL", "3600")),
             api_key=os.getenv("POLY_API_KEY", ""),
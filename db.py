@@ -4,69 +4,938 @@ db.py
 SQLite storage layer.
 
 Design notes:
-- Each thread gets its own connection via threading.local() to avoid
-  sqlite3's "check_same_thread" restriction.
+- Writes go through a per-thread connection (a per-Database
+  threading.local()), closed when its thread is collected.  Reads check
+  out a read-only connection from a small bounded pool.  Database.close()
+  closes all of them.
 - Public methods accept plain dicts and return plain dicts (no ORM).
 - The schema is created automatically on first run.
 """
 
 import csv
-import io
+import itertools
+import json
 import logging
+import operator
 import os
 import sqlite3
 import threading
-from datetime import datetime
-from typing import Dict, List, Optional
+import urllib.parse
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:  # optional: vectorized CSV export engine
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
 
 logger = logging.getLogger(__name__)
 
-# Thread-local storage so each thread owns its connection
-_local = threading.local()
+# Database.export_csv engines: "csv" (stdlib, the default) or "arrow"
+# (pyarrow, opt-in)
+_CSV_ENGINES = ("csv", "arrow")
+
+# Rows pulled from the cursor per fetchmany() during CSV export
+_CSV_FETCH_ROWS = 1000
+
+# Allowed get_wallets sort keys → ORDER BY column (also the injection guard)
+_WALLET_ORDER_COLUMNS = {
+    "total_volume": "total_volume",
+    "realized_pnl": "realized_pnl",
+    "total_trades": "total_trades",
+    "last_seen":    "last_seen",
+}
+
+# Columns supplied by callers on insert (id and created_at are defaulted)
+_TRADE_INSERT_COLUMNS = (
+    "transaction_hash, market_id, token_id, proxy_wallet, side, "
+    "price, size, amount, outcome, outcome_index, "
+    "market_title, market_slug, market_icon, match_time"
+)
+_TRADE_INSERT_NAMES = tuple(_TRADE_INSERT_COLUMNS.split(", "))
+
+# Trade dict → positional parameter tuple in _TRADE_INSERT_NAMES order,
+# for the batch paths (no per-column :name lookup by sqlite3)
+_pack_trade = operator.itemgetter(*_TRADE_INSERT_NAMES)
+
+# Internal columns derived in SQL from caller-supplied ones on every
+# insert: name → expression over the source columns named in braces.
+_DERIVED_TRADE_COLUMNS = {
+    # USDC as integer micro-USDC: exact integer SUMs
+    "amount_micro": "CAST(round({amount} * 1000000) AS INTEGER)",
+    # BUY=1 / SELL=0 (NULL otherwise): 0 and 1 take no payload bytes in
+    # a SQLite record, and compare as a single integer opcode
+    "side_i":       "CASE {side} WHEN 'BUY' THEN 1 WHEN 'SELL' THEN 0 END",
+}
+_DERIVED_TRADE_NAMES = ", ".join(_DERIVED_TRADE_COLUMNS)
+
+
+def _derived_trade_expr(name: str, ref: Callable[[str], str]) -> str:
+    """Expression for derived column `name`, each source rendered by `ref`."""
+    return _DERIVED_TRADE_COLUMNS[name].format_map(
+        {c: ref(c) for c in _TRADE_INSERT_NAMES}
+    )
+
+
+def _derived_trade_values(ref: Callable[[str], str]) -> str:
+    return ", ".join(_derived_trade_expr(n, ref) for n in _DERIVED_TRADE_COLUMNS)
+
+
+_INSERT_TRADE_SQL = f"""
+    INSERT OR IGNORE INTO trades (
+        transaction_hash, market_id, token_id, proxy_wallet, side,
+        price, size, amount, outcome, outcome_index,
+        market_title, market_slug, market_icon, match_time,
+        {_DERIVED_TRADE_NAMES}
+    ) VALUES (
+        :transaction_hash, :market_id, :token_id, :proxy_wallet, :side,
+        :price, :size, :amount, :outcome, :outcome_index,
+        :market_title, :market_slug, :market_icon, :match_time,
+        {_derived_trade_values(lambda c: ":" + c)}
+    )
+"""
+
+# Positional (?NNN) form of _INSERT_TRADE_SQL, for insert_trades
+_INSERT_TRADE_POSITIONAL_SQL = (
+    f"INSERT OR IGNORE INTO trades ({_TRADE_INSERT_COLUMNS}, {_DERIVED_TRADE_NAMES}) "
+    f"VALUES ({', '.join(f'?{i}' for i in range(1, len(_TRADE_INSERT_NAMES) + 1))}, "
+    f"{_derived_trade_values(lambda c: f'?{_TRADE_INSERT_NAMES.index(c) + 1}')})"
+)
+
+# Public trade columns (everything except the derived ones), in table
+# order — what SELECT t.* returned before derived columns existed.
+_TRADE_SELECT_COLUMNS = ", ".join(
+    "t." + c for c in ("id", *_TRADE_INSERT_NAMES, "created_at")
+)
+
+_UPSERT_TRADER_SQL = """
+    INSERT INTO traders (
+        proxy_wallet, name, pseudonym, profile_image, bio,
+        num_trades, pnl_cumulative, last_updated
+    ) VALUES (
+        :proxy_wallet, :name, :pseudonym, :profile_image, :bio,
+        :num_trades, :pnl_cumulative, :last_updated
+    )
+    ON CONFLICT(proxy_wallet) DO UPDATE SET
+        name           = COALESCE(excluded.name, traders.name),
+        pseudonym      = COALESCE(excluded.pseudonym, traders.pseudonym),
+        profile_image  = COALESCE(excluded.profile_image, traders.profile_image),
+        bio            = COALESCE(excluded.bio, traders.bio),
+        last_updated   = excluded.last_updated
+"""
+
+# Columns added to the Phase 2 tables after release: (table, name, type).
+_ANALYZER_COLUMNS = (
+    ("wallets",   "last_profile_attempt", "REAL"),
+    ("wallets",   "last_trade_id",        "INTEGER"),
+    ("positions", "fifo_state",           "BLOB"),
+)
+
+_UPSERT_WALLET_SQL = """
+    INSERT INTO wallets (
+        address, name, pseudonym, profile_image, bio,
+        first_seen, last_seen, total_trades, total_volume,
+        total_buy_volume, total_sell_volume, largest_trade,
+        avg_trade_size, num_active_positions, win_rate,
+        realized_pnl, last_updated, last_profile_attempt, last_trade_id
+    ) VALUES (
+        :address, :name, :pseudonym, :profile_image, :bio,
+        :first_seen, :last_seen, :total_trades, :total_volume,
+        :total_buy_volume, :total_sell_volume, :largest_trade,
+        :avg_trade_size, :num_active_positions, :win_rate,
+        :realized_pnl, :last_updated, :last_profile_attempt, :last_trade_id
+    )
+    ON CONFLICT(address) DO UPDATE SET
+        name             = COALESCE(excluded.name,          wallets.name),
+        pseudonym        = COALESCE(excluded.pseudonym,     wallets.pseudonym),
+        profile_image    = COALESCE(excluded.profile_image, wallets.profile_image),
+        bio              = COALESCE(excluded.bio,           wallets.bio),
+        first_seen       = excluded.first_seen,
+        last_seen        = excluded.last_seen,
+        total_trades     = excluded.total_trades,
+        total_volume     = excluded.total_volume,
+        total_buy_volume = excluded.total_buy_volume,
+        total_sell_volume= excluded.total_sell_volume,
+        largest_trade    = excluded.largest_trade,
+        avg_trade_size   = excluded.avg_trade_size,
+        num_active_positions = excluded.num_active_positions,
+        win_rate         = excluded.win_rate,
+        realized_pnl     = excluded.realized_pnl,
+        last_updated     = excluded.last_updated,
+        last_profile_attempt = COALESCE(excluded.last_profile_attempt,
+                                        wallets.last_profile_attempt),
+        last_trade_id    = excluded.last_trade_id
+"""
+
+_UPDATE_WALLET_PROFILE_SQL = """
+    UPDATE wallets SET
+        name                 = COALESCE(:name,          name),
+        pseudonym            = COALESCE(:pseudonym,     pseudonym),
+        profile_image        = COALESCE(:profile_image, profile_image),
+        bio                  = COALESCE(:bio,           bio),
+        last_profile_attempt = :last_profile_attempt
+    WHERE address = :address
+"""
+
+_UPSERT_POSITION_SQL = """
+    INSERT INTO positions (
+        wallet_address, condition_id, outcome,
+        net_shares, avg_entry_price, total_bought, total_sold,
+        realized_pnl, last_updated, fifo_state
+    ) VALUES (
+        :wallet_address, :condition_id, :outcome,
+        :net_shares, :avg_entry_price, :total_bought, :total_sold,
+        :realized_pnl, :last_updated, :fifo_state
+    )
+    ON CONFLICT(wallet_address, condition_id, outcome) DO UPDATE SET
+        net_shares      = excluded.net_shares,
+        avg_entry_price = excluded.avg_entry_price,
+        total_bought    = excluded.total_bought,
+        total_sold      = excluded.total_sold,
+        realized_pnl    = excluded.realized_pnl,
+        last_updated    = excluded.last_updated,
+        fifo_state      = excluded.fifo_state
+"""
+
+_UPSERT_MARKET_SQL = """
+    INSERT INTO markets (
+        condition_id, title, slug, icon, description, category,
+        end_date, resolved, winning_outcome, last_fetched
+    ) VALUES (
+        :condition_id, :title, :slug, :icon, :description, :category,
+        :end_date, :resolved, :winning_outcome, :last_fetched
+    )
+    ON CONFLICT(condition_id) DO UPDATE SET
+        title           = COALESCE(excluded.title,           markets.title),
+        slug            = COALESCE(excluded.slug,            markets.slug),
+        icon            = COALESCE(excluded.icon,            markets.icon),
+        description     = COALESCE(excluded.description,     markets.description),
+        category        = COALESCE(excluded.category,        markets.category),
+        end_date        = COALESCE(excluded.end_date,        markets.end_date),
+        resolved        = excluded.resolved,
+        winning_outcome = COALESCE(excluded.winning_outcome, markets.winning_outcome),
+        last_fetched    = excluded.last_fetched
+"""
+
+# WalletAnalyzer's trade scans (iter_trades_grouped_by_wallet).  Both
+# order each wallet's trades by (match_time, id), so trades in the same
+# second reach the FIFO in the same order on either path.  The
+# full-history walk reads idx_trades_wallet_time backwards and only sorts
+# within equal match_times (ORDER BY names trades.match_time: the bare
+# name would bind to the CAST alias, which the index can't supply).  The
+# new-trades scan seeks the trades.id range instead and sorts just those
+# rows: the unary + keeps the planner off the full index walk.  Trades
+# already applied to a wallet (id <= last_trade_id) are skipped in SQL,
+# so a restart doesn't re-read every history.
+_WALLET_TRADE_COLUMNS = """
+    SELECT proxy_wallet, market_id, outcome, side,
+           CAST(price AS REAL)        AS price,
+           CAST(size AS REAL)         AS size,
+           CAST(amount AS REAL)       AS amount,
+           CAST(match_time AS INTEGER) AS match_time
+    FROM trades
+"""
+_WALLET_HISTORY_SQL = _WALLET_TRADE_COLUMNS + """
+    WHERE id <= ?
+    ORDER BY proxy_wallet DESC, trades.match_time ASC, trades.id ASC
+"""
+_WALLET_NEW_TRADES_SQL = _WALLET_TRADE_COLUMNS + """
+    WHERE id > ? AND id <= ?
+      AND id > COALESCE(
+          (SELECT last_trade_id FROM wallets WHERE address = trades.proxy_wallet), 0)
+    ORDER BY +proxy_wallet DESC, trades.match_time ASC, trades.id ASC
+"""
+
+# Rollups of trades kept current by the trg_trades_insert trigger, so the
+# dashboard aggregates read a few rows instead of scanning trades:
+# (table, CREATE TABLE, per-row upsert run by the trigger, backfill).
+# A NULL outcome is stored as '' (a primary key column must be non-NULL
+# for ON CONFLICT to match) and mapped back on read.
+_TRADE_ROLLUPS = (
+    (
+        "market_stats",
+        """
+        CREATE TABLE market_stats (
+            market_id        TEXT    PRIMARY KEY,
+            total_trades     INTEGER DEFAULT 0,
+            volume_micro     INTEGER DEFAULT 0,
+            largest_micro    INTEGER DEFAULT 0,
+            max_match_time   INTEGER DEFAULT 0
+        )
+        """,
+        """
+        INSERT INTO market_stats (
+            market_id, total_trades, volume_micro, largest_micro, max_match_time
+        ) VALUES (
+            NEW.market_id, 1, NEW.amount_micro, NEW.amount_micro, NEW.match_time
+        )
+        ON CONFLICT(market_id) DO UPDATE SET
+            total_trades   = total_trades + 1,
+            volume_micro   = volume_micro + NEW.amount_micro,
+            largest_micro  = MAX(largest_micro, NEW.amount_micro),
+            max_match_time = MAX(max_match_time, NEW.match_time);
+        """,
+        """
+        INSERT INTO market_stats (
+            market_id, total_trades, volume_micro, largest_micro, max_match_time
+        )
+        SELECT market_id, COUNT(*), SUM(amount_micro), MAX(amount_micro), MAX(match_time)
+        FROM trades
+        GROUP BY market_id
+        """,
+    ),
+    (
+        "outcome_stats",
+        """
+        CREATE TABLE outcome_stats (
+            market_id        TEXT    NOT NULL,
+            outcome          TEXT    NOT NULL,
+            side             TEXT    NOT NULL,
+            trade_count      INTEGER DEFAULT 0,
+            volume_micro     INTEGER DEFAULT 0,
+            price_sum        REAL    DEFAULT 0,   -- AVG(price) = price_sum / trade_count
+            PRIMARY KEY (market_id, outcome, side)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO outcome_stats (
+            market_id, outcome, side, trade_count, volume_micro, price_sum
+        ) VALUES (
+            NEW.market_id, IFNULL(NEW.outcome, ''), NEW.side, 1, NEW.amount_micro, NEW.price
+        )
+        ON CONFLICT(market_id, outcome, side) DO UPDATE SET
+            trade_count  = trade_count + 1,
+            volume_micro = volume_micro + NEW.amount_micro,
+            price_sum    = price_sum + NEW.price;
+        """,
+        """
+        INSERT INTO outcome_stats (
+            market_id, outcome, side, trade_count, volume_micro, price_sum
+        )
+        SELECT market_id, IFNULL(outcome, ''), side, COUNT(*), SUM(amount_micro), SUM(price)
+        FROM trades
+        GROUP BY market_id, IFNULL(outcome, ''), side
+        """,
+    ),
+    (
+        "trader_stats",
+        """
+        CREATE TABLE trader_stats (
+            market_id        TEXT    NOT NULL,
+            proxy_wallet     TEXT    NOT NULL,
+            trade_count      INTEGER DEFAULT 0,
+            volume_micro     INTEGER DEFAULT 0,
+            buy_micro        INTEGER DEFAULT 0,
+            sell_micro       INTEGER DEFAULT 0,
+            largest_micro    INTEGER DEFAULT 0,
+            last_match_time  INTEGER DEFAULT 0,
+            PRIMARY KEY (market_id, proxy_wallet)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO trader_stats (
+            market_id, proxy_wallet, trade_count, volume_micro,
+            buy_micro, sell_micro, largest_micro, last_match_time
+        ) VALUES (
+            NEW.market_id, NEW.proxy_wallet, 1, NEW.amount_micro,
+            CASE WHEN NEW.side_i = 1 THEN NEW.amount_micro ELSE 0 END,
+            CASE WHEN NEW.side_i = 0 THEN NEW.amount_micro ELSE 0 END,
+            NEW.amount_micro, NEW.match_time
+        )
+        ON CONFLICT(market_id, proxy_wallet) DO UPDATE SET
+            trade_count     = trade_count + 1,
+            volume_micro    = volume_micro + NEW.amount_micro,
+            buy_micro       = buy_micro + excluded.buy_micro,
+            sell_micro      = sell_micro + excluded.sell_micro,
+            largest_micro   = MAX(largest_micro, NEW.amount_micro),
+            last_match_time = MAX(last_match_time, NEW.match_time);
+        """,
+        """
+        INSERT INTO trader_stats (
+            market_id, proxy_wallet, trade_count, volume_micro,
+            buy_micro, sell_micro, largest_micro, last_match_time
+        )
+        SELECT
+            market_id, proxy_wallet, COUNT(*), SUM(amount_micro),
+            SUM(CASE WHEN side_i = 1 THEN amount_micro ELSE 0 END),
+            SUM(CASE WHEN side_i = 0 THEN amount_micro ELSE 0 END),
+            MAX(amount_micro), MAX(match_time)
+        FROM trades
+        GROUP BY market_id, proxy_wallet
+        """,
+    ),
+    (
+        "trader_totals",
+        """
+        CREATE TABLE trader_totals (
+            proxy_wallet     TEXT    PRIMARY KEY,
+            trade_count      INTEGER DEFAULT 0,
+            volume_micro     INTEGER DEFAULT 0,
+            buy_micro        INTEGER DEFAULT 0,
+            sell_micro       INTEGER DEFAULT 0,
+            largest_micro    INTEGER DEFAULT 0,
+            last_match_time  INTEGER DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO trader_totals (
+            proxy_wallet, trade_count, volume_micro,
+            buy_micro, sell_micro, largest_micro, last_match_time
+        ) VALUES (
+            NEW.proxy_wallet, 1, NEW.amount_micro,
+            CASE WHEN NEW.side_i = 1 THEN NEW.amount_micro ELSE 0 END,
+            CASE WHEN NEW.side_i = 0 THEN NEW.amount_micro ELSE 0 END,
+            NEW.amount_micro, NEW.match_time
+        )
+        ON CONFLICT(proxy_wallet) DO UPDATE SET
+            trade_count     = trade_count + 1,
+            volume_micro    = volume_micro + NEW.amount_micro,
+            buy_micro       = buy_micro + excluded.buy_micro,
+            sell_micro      = sell_micro + excluded.sell_micro,
+            largest_micro   = MAX(largest_micro, NEW.amount_micro),
+            last_match_time = MAX(last_match_time, NEW.match_time);
+        """,
+        """
+        INSERT INTO trader_totals (
+            proxy_wallet, trade_count, volume_micro,
+            buy_micro, sell_micro, largest_micro, last_match_time
+        )
+        SELECT
+            proxy_wallet, COUNT(*), SUM(amount_micro),
+            SUM(CASE WHEN side_i = 1 THEN amount_micro ELSE 0 END),
+            SUM(CASE WHEN side_i = 0 THEN amount_micro ELSE 0 END),
+            MAX(amount_micro), MAX(match_time)
+        FROM trades
+        GROUP BY proxy_wallet
+        """,
+    ),
+)
+
+# Leaderboard order for the trader rollups, so get_top_traders walks an
+# index (keyset pagination continues from the last row) instead of sorting
+_ROLLUP_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_trader_stats_volume "
+    "ON trader_stats(market_id, volume_micro DESC, proxy_wallet DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_trader_totals_volume "
+    "ON trader_totals(volume_micro DESC, proxy_wallet DESC)",
+)
+
+# Per-connection prepared-statement cache (sqlite3 default is 128)
+_STATEMENT_CACHE_SIZE = 256
+
+# How long a connection waits on a locked database before SQLITE_BUSY
+_BUSY_TIMEOUT_S = 5.0
+
+# Read-only connections kept by each Database, and how long a reader
+# waits for one when all are checked out
+_READ_POOL_SIZE = 8
+_READ_POOL_TIMEOUT_S = 30.0
+
+# insert_trades transaction size: large enough to amortise the commit,
+# small enough to stay within the page cache
+_INSERT_BATCH_ROWS = 5000
+
+# Accepted values for Database(synchronous=…); interpolated into a PRAGMA
+_SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+# Accepted Database.checkpoint() modes; interpolated into a PRAGMA
+_CHECKPOINT_MODES = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+
+
+def _build_recent_trades_sql(derived: bool, by_wallet: bool) -> str:
+    """
+    Static, named-parameter SQL for Database._execute_recent_trades.
+
+    market_id / min_amount are NULL-gated in the statement itself, so one
+    prepared plan (a walk down idx_trades_time) serves every combination.
+    A wallet filter gets its own variant: gated the same way it would
+    also walk idx_trades_time and scan the whole table for a quiet wallet,
+    whereas a plain equality lets the planner seek the wallet index.
+    `derived` adds the AnalysisService.classify_trade fields.
+    """
+    columns = ""
+    if derived:
+        columns = """,
+            CASE
+                WHEN t.amount >= :whale  THEN 'whale'
+                WHEN t.amount >= :medium THEN 'medium'
+                ELSE 'small'
+            END                                  AS size_class,
+            t.amount >= :whale                   AS is_whale,
+            CASE WHEN t.match_time
+                THEN strftime('%Y-%m-%d %H:%M', t.match_time, 'unixepoch') || ' UTC'
+                ELSE '—'
+            END                                  AS display_time"""
+    wallet = "AND t.proxy_wallet = :wallet" if by_wallet else ""
+    return f"""
+        SELECT
+            {_TRADE_SELECT_COLUMNS},
+            tr.name        AS trader_name,
+            tr.pseudonym   AS trader_pseudonym,
+            tr.profile_image AS trader_profile_image{columns}
+        FROM trades t
+        LEFT JOIN traders tr ON t.proxy_wallet = tr.proxy_wallet
+        WHERE (:market_id  IS NULL OR t.market_id = :market_id)
+          AND (:min_amount IS NULL OR t.amount >= :min_amount)
+          {wallet}
+        ORDER BY t.match_time DESC
+        LIMIT :limit
+    """
+
+
+# (with classification columns, filtered by wallet) → SQL
+_RECENT_TRADES_SQL = {
+    (derived, by_wallet): _build_recent_trades_sql(derived, by_wallet)
+    for derived in (False, True)
+    for by_wallet in (False, True)
+}
+
+
+def _build_recent_trades_json_sql(derived: bool, by_wallet: bool) -> str:
+    """
+    The recent-trades query with SQLite serialising the result: one TEXT
+    value holding the JSON array, keys and order as get_recent_trades.
+    json_group_array consumes the subquery in its ORDER BY order.
+    """
+    exprs = {n: n for n in ("id", *_TRADE_INSERT_NAMES, "created_at",
+                            "trader_name", "trader_pseudonym", "trader_profile_image")}
+    if derived:
+        exprs["size_class"] = "size_class"
+        # A JSON true/false, as get_recent_trades returns, not SQLite's 1/0
+        exprs["is_whale"] = "json(CASE WHEN is_whale THEN 'true' ELSE 'false' END)"
+        exprs["display_time"] = "display_time"
+    fields = ", ".join(f"'{n}', {expr}" for n, expr in exprs.items())
+    return f"""
+        SELECT json_group_array(json_object({fields}))
+        FROM ({_build_recent_trades_sql(derived, by_wallet)})
+    """
+
+
+_RECENT_TRADES_JSON_SQL = {
+    (derived, by_wallet): _build_recent_trades_json_sql(derived, by_wallet)
+    for derived in (False, True)
+    for by_wallet in (False, True)
+}
+
+
+# The remaining filtered readers likewise pick a prebuilt statement per
+# filter combination: the SQL text is fixed, so each variant is parsed
+# once per connection and then served from the statement cache, and
+# callers bind positional parameters in the order the variant expects.
+
+def _build_volume_by_outcome_sql(by_market: bool) -> str:
+    """Database.get_volume_by_outcome; params: [market_id]."""
+    where = "WHERE market_id = ?" if by_market else ""
+    return f"""
+        SELECT
+            NULLIF(outcome, '')  AS outcome,
+            side,
+            SUM(trade_count)     AS trade_count,
+            SUM(volume_micro) / 1e6 AS volume,
+            SUM(price_sum) / SUM(trade_count) AS avg_price
+        FROM outcome_stats {where}
+        GROUP BY outcome, side
+        ORDER BY outcome, side
+    """
+
+
+_VOLUME_BY_OUTCOME_SQL = {
+    by_market: _build_volume_by_outcome_sql(by_market)
+    for by_market in (False, True)
+}
+
+
+def _build_volume_pivot_sql(by_market: bool) -> str:
+    """
+    Database.get_volume_pivot; params: [market_id].  One row per outcome
+    with the BUY and SELL sides as columns; a missing side reads as 0.
+    """
+    where = "WHERE market_id = ?" if by_market else ""
+    buy = "UPPER(side) = 'BUY'"
+    sell = "UPPER(side) = 'SELL'"
+    return f"""
+        SELECT
+            COALESCE(NULLIF(outcome, ''), 'Unknown') AS outcome,
+            COALESCE(SUM(CASE WHEN {buy}  THEN volume_micro END), 0) / 1e6 AS buy_volume,
+            COALESCE(SUM(CASE WHEN {sell} THEN volume_micro END), 0) / 1e6 AS sell_volume,
+            COALESCE(SUM(CASE WHEN {buy}  THEN trade_count END), 0) AS buy_count,
+            COALESCE(SUM(CASE WHEN {sell} THEN trade_count END), 0) AS sell_count,
+            COALESCE(
+                SUM(CASE WHEN {buy} THEN price_sum END)
+                / SUM(CASE WHEN {buy} THEN trade_count END),
+                0.0
+            ) AS avg_price
+        FROM outcome_stats {where}
+        GROUP BY NULLIF(outcome, '')
+        ORDER BY NULLIF(outcome, '')
+    """
+
+
+_VOLUME_PIVOT_SQL = {
+    by_market: _build_volume_pivot_sql(by_market)
+    for by_market in (False, True)
+}
+
+
+def _build_top_traders_sql(by_market: bool, paged: bool, derived: bool) -> str:
+    """
+    Database.get_top_traders; params: [whale, medium], [market_id],
+    [last_volume_micro, last_wallet], limit.  One rollup row per wallet
+    (trader_totals, or trader_stats within a market), read in
+    idx_trader_*_volume order: no aggregate, no sort.  `derived` adds the
+    size_class that AnalysisService reports for each trader.
+    """
+    clauses = []
+    if by_market:
+        clauses.append("s.market_id = ?")
+    if paged:
+        clauses.append("(s.volume_micro, s.proxy_wallet) < (?, ?)")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    size_class = ""
+    if derived:
+        size_class = """,
+            CASE
+                WHEN s.volume_micro / 1e6 >= ? THEN 'whale'
+                WHEN s.volume_micro / 1e6 >= ? THEN 'medium'
+                ELSE 'small'
+            END                    AS size_class"""
+    return f"""
+        SELECT
+            s.proxy_wallet,
+            tr.name,
+            tr.pseudonym,
+            tr.profile_image,
+            s.trade_count,
+            s.volume_micro / 1e6   AS total_volume,
+            s.buy_micro / 1e6      AS buy_volume,
+            s.sell_micro / 1e6     AS sell_volume,
+            s.largest_micro / 1e6  AS largest_trade,
+            s.last_match_time      AS last_trade_time{size_class}
+        FROM {"trader_stats" if by_market else "trader_totals"} s
+        LEFT JOIN traders tr ON s.proxy_wallet = tr.proxy_wallet
+        {where}
+        ORDER BY s.volume_micro DESC, s.proxy_wallet DESC
+        LIMIT ?
+    """
+
+
+_TOP_TRADERS_SQL = {
+    (by_market, paged, derived): _build_top_traders_sql(by_market, paged, derived)
+    for by_market in (False, True)
+    for paged in (False, True)
+    for derived in (False, True)
+}
+
+
+def _build_wallets_sql(order_col: str, filtered: bool, paged: bool) -> str:
+    """
+    Database.get_wallets; params: [min_volume], [last_value, last_address],
+    limit.  Ties on `order_col` are broken by address.
+    """
+    clauses = []
+    if filtered:
+        clauses.append("total_volume >= ?")
+    if paged:
+        clauses.append(f"({order_col}, address) < (?, ?)")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return (
+        f"SELECT * FROM wallets {where} "
+        f"ORDER BY {order_col} DESC, address DESC LIMIT ?"
+    )
+
+
+# (order_by, min_volume given, paged) → SQL
+_WALLETS_SQL = {
+    (order_by, filtered, paged): _build_wallets_sql(order_col, filtered, paged)
+    for order_by, order_col in _WALLET_ORDER_COLUMNS.items()
+    for filtered in (False, True)
+    for paged in (False, True)
+}
+
+
+def _rows_to_dicts(cur: sqlite3.Cursor) -> List[Dict]:
+    """Materialise a result set as dicts, reading column names once."""
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, row)) for row in cur]
+
+
+def _cursor_to_arrow(cur: sqlite3.Cursor, head: Optional[List] = None) -> "pa.Table":
+    """
+    Drain `cur` into a pyarrow.Table, column by column (no per-row dicts).
+    `head` holds rows already fetched from the cursor.
+    """
+    cols = [d[0] for d in cur.description]
+    rows = (head or []) + cur.fetchall()
+    if not rows:
+        return pa.table([pa.array([]) for _ in cols], names=cols)
+    return pa.table([pa.array(col) for col in zip(*rows)], names=cols)
+
+
+def _release_conn(
+    conns: Set[sqlite3.Connection],
+    lock: threading.Lock,
+    conn: sqlite3.Connection,
+) -> None:
+    """Unregister and close a connection (also the thread-exit finalizer)."""
+    with lock:
+        conns.discard(conn)
+    conn.close()
 
 
 class Database:
     """Thin wrapper around SQLite providing CRUD + CSV export."""
 
-    def __init__(self, db_path: str):
+    def __init__(
+        self,
+        db_path: str,
+        synchronous: str = "NORMAL",
+        read_pool_size: int = _READ_POOL_SIZE,
+    ):
+        """
+        synchronous — SQLite sync level for every connection.  NORMAL is
+        crash-safe under WAL (only the last commits can roll back on power
+        loss); pass "FULL" when every commit must be durable.
+
+        read_pool_size — maximum number of read-only connections, shared by
+        all reading threads.  Readers beyond it wait for one to free up.
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in _SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Invalid synchronous level: {synchronous!r}")
         self.db_path = db_path
+        self.synchronous = synchronous
+        # Thread-local write connections, a bounded pool of read-only
+        # ones, and a registry so close() reaches all of them.  close()
+        # bumps _epoch, which makes threads still holding a closed
+        # connection open a fresh one.
+        self._local = threading.local()
+        self._conns: Set[sqlite3.Connection] = set()
+        self._conns_lock = threading.Lock()
+        self._epoch = 0
+        self._read_idle: List[sqlite3.Connection] = []   # guarded by _conns_lock
+        self._read_slots = threading.BoundedSemaphore(read_pool_size)
         db_dir = os.path.dirname(db_path)
         if db_dir:
             os.makedirs(db_dir, exist_ok=True)
         self._create_schema()
-        self._extend_schema()
+        self._update_planner_stats()
 
     # ----------------------------------------------------------------
     # Connection management
     # ----------------------------------------------------------------
 
     def _get_conn(self) -> sqlite3.Connection:
-        """Return a thread-local SQLite connection, creating it if needed."""
-        if not hasattr(_local, "conn") or _local.conn is None:
-            conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA journal_mode=WAL")   # safe for multi-threaded reads
+        """
+        Return this thread's read-write SQLite connection, creating it if
+        needed.  Writes stay thread-bound so transaction() can nest.
+        """
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None or local.epoch != self._epoch:
+            conn = local.conn = self._open_conn(readonly=False)
+            local.epoch = self._epoch
+            # Close with the thread rather than at interpreter exit
+            weakref.finalize(
+                threading.current_thread(),
+                _release_conn, self._conns, self._conns_lock, conn,
+            )
+        return conn
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Check out a pooled read-only connection (mode=ro, query_only).
+        Used by every SELECT path: it never takes write-side locks, and an
+        accidentally mutating statement fails immediately.  The most
+        recently returned connection is reused first, so its page cache
+        is still warm.
+        """
+        if not self._read_slots.acquire(timeout=_READ_POOL_TIMEOUT_S):
+            raise sqlite3.OperationalError("read connection pool exhausted")
+        try:
+            with self._conns_lock:
+                epoch = self._epoch
+                conn = self._read_idle.pop() if self._read_idle else None
+            if conn is None:
+                conn = self._open_conn(readonly=True)
+            try:
+                yield conn
+            finally:
+                with self._conns_lock:
+                    stale = epoch != self._epoch
+                    if not stale:
+                        self._read_idle.append(conn)
+                if stale:
+                    _release_conn(self._conns, self._conns_lock, conn)
+        finally:
+            self._read_slots.release()
+
+    @contextmanager
+    def _dict_cursor(self) -> Iterator[sqlite3.Cursor]:
+        """Pooled read cursor yielding sqlite3.Row, for lookups by name."""
+        with self._reader() as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            try:
+                yield cur
+            finally:
+                cur.close()
+
+    @contextmanager
+    def _tuple_cursor(self) -> Iterator[sqlite3.Cursor]:
+        """Pooled read cursor yielding plain tuples — no per-row object beyond the tuple."""
+        with self._reader() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+            finally:
+                # Reset the statement before the connection is reused,
+                # even if the caller stopped fetching early
+                cur.close()
+
+    def _open_conn(self, readonly: bool) -> sqlite3.Connection:
+        """Open, tune and register a new connection."""
+        # Statement cache sized to hold every distinct SQL text this
+        # module issues (including all filter combinations), so each
+        # is compiled once per connection.
+        # isolation_level=None: no implicit BEGIN before DML; writes
+        # are grouped explicitly with transaction().
+        if readonly:
+            target = "file:" + urllib.parse.quote(os.path.abspath(self.db_path)) + "?mode=ro"
+        else:
+            target = self.db_path
+        conn = sqlite3.connect(
+            target,
+            uri=readonly,
+            check_same_thread=False,
+            timeout=_BUSY_TIMEOUT_S,               # sqlite3_busy_timeout
+            cached_statements=_STATEMENT_CACHE_SIZE,
+            isolation_level=None,
+        )
+        # No connection-wide row_factory: rows are plain tuples unless a
+        # reader asks for sqlite3.Row via _dict_cursor().
+        if readonly:
+            self._apply_read_pragmas(conn)
+            conn.execute("PRAGMA query_only=1")
+        else:
+            self._apply_pragmas(conn)
             conn.execute("PRAGMA foreign_keys=ON")
-            _local.conn = conn
-        return _local.conn
+
+        with self._conns_lock:
+            self._conns.add(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a group of writes as one transaction (one commit, one WAL sync)::
+
+            with db.transaction():
+                for t in trades:
+                    db.insert_trade(t)
+
+        Takes the write lock up front (BEGIN IMMEDIATE) and commits on
+        exit, or rolls back if the block raises.  Nested use — including
+        the write methods' own — joins the outer transaction, so only the
+        outermost block commits.
+        """
+        conn = self._get_conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _apply_pragmas(self, conn: sqlite3.Connection) -> None:
+        """Tuning for read-write connections (thread-local and schema)."""
+        conn.execute("PRAGMA journal_mode=WAL")   # safe for multi-threaded reads
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        # Auto-checkpoint every ~40 MB of WAL (4 KB pages) instead of the
+        # default 1000 pages, so batch ingestion isn't interrupted by a
+        # checkpoint every few commits; IngestionService also calls
+        # checkpoint() periodically to truncate the file.
+        conn.execute("PRAGMA wal_autocheckpoint=10000")
+        self._apply_read_pragmas(conn)
+
+    @staticmethod
+    def _apply_read_pragmas(conn: sqlite3.Connection) -> None:
+        """Query-side tuning; the only PRAGMAs applied to read-only connections."""
+        conn.execute("PRAGMA temp_store=MEMORY")      # GROUP BY / ORDER BY temp b-trees
+        conn.execute("PRAGMA cache_size=-65536")      # 64 MB page cache
+        conn.execute("PRAGMA mmap_size=268435456")    # 256 MB memory-mapped reads
+
+    def optimize(self) -> None:
+        """
+        Run PRAGMA optimize on this thread's connection: re-gathers planner
+        statistics only for tables whose contents changed materially, so it
+        is cheap enough to call periodically (IngestionService does).
+        """
+        try:
+            self._get_conn().execute("PRAGMA optimize")
+        except sqlite3.Error as exc:
+            logger.warning("PRAGMA optimize failed: %s", exc)
+
+    def checkpoint(self, mode: str = "TRUNCATE") -> None:
+        """
+        Run PRAGMA wal_checkpoint(mode) on this thread's connection.
+        TRUNCATE copies the WAL back into the database and resets the
+        file to zero bytes, bounding its size under sustained ingestion.
+        A checkpoint blocked by active readers is logged and left for the
+        next call.
+        """
+        mode = mode.upper()
+        if mode not in _CHECKPOINT_MODES:
+            raise ValueError(f"Invalid checkpoint mode: {mode!r}")
+        try:
+            busy, log_pages, done = self._get_conn().execute(
+                f"PRAGMA wal_checkpoint({mode})"
+            ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("WAL checkpoint failed: %s", exc)
+            return
+        if busy:
+            logger.debug("WAL checkpoint incomplete: %d/%d pages", done, log_pages)
+
+    def journal_mode(self) -> str:
+        """The database's journal mode as SQLite reports it (lower case)."""
+        return self._get_conn().execute("PRAGMA journal_mode").fetchone()[0].lower()
 
     def close(self):
-        """Close the thread-local connection if open (useful in tests / cleanup)."""
-        conn = getattr(_local, "conn", None)
-        if conn is not None:
+        """Close every thread's connection (useful in tests / cleanup)."""
+        if getattr(self._local, "conn", None) is not None and self._local.epoch == self._epoch:
+            self.optimize()
+        with self._conns_lock:
+            self._epoch += 1
+            conns = list(self._conns)
+            self._conns.clear()
+            self._read_idle.clear()
+        for conn in conns:
             conn.close()
-            _local.conn = None
 
     # ----------------------------------------------------------------
     # Schema
     # ----------------------------------------------------------------
 
     def _create_schema(self):
-        """Create tables and indexes if they don't exist."""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("PRAGMA journal_mode=WAL")
+        """
+        Create (or migrate) every table, index and rollup — trades plus the
+        Phase 2 wallets, markets and positions — in a single transaction
+        on this thread's connection.  Non-destructive.
+        """
+        conn = self._get_conn()
+        try:
+            # executescript commits any open transaction before it runs,
+            # so the script itself opens the one the steps below join.
+            conn.executescript("""
+            BEGIN IMMEDIATE;
 
-        conn.executescript("""
             CREATE TABLE IF NOT EXISTS trades (
                 id               INTEGER PRIMARY KEY AUTOINCREMENT,
                 transaction_hash TEXT    UNIQUE,
@@ -83,7 +952,9 @@ class Database:
                 market_slug      TEXT,
                 market_icon      TEXT,
                 match_time       INTEGER NOT NULL,   -- Unix timestamp (seconds)
-                created_at       TEXT    NOT NULL DEFAULT (datetime('now'))
+                created_at       TEXT    NOT NULL DEFAULT (datetime('now')),
+                amount_micro     INTEGER,            -- amount in integer micro-USDC
+                side_i           INTEGER             -- BUY=1 | SELL=0
             );
 
             CREATE TABLE IF NOT EXISTS traders (
@@ -97,21 +968,6 @@ class Database:
                 last_updated     TEXT    NOT NULL
             );
 
-            CREATE INDEX IF NOT EXISTS idx_trades_market  ON trades(market_id);
-            CREATE INDEX IF NOT EXISTS idx_trades_wallet  ON trades(proxy_wallet);
-            CREATE INDEX IF NOT EXISTS idx_trades_time    ON trades(match_time DESC);
-            CREATE INDEX IF NOT EXISTS idx_trades_amount  ON trades(amount DESC);
-        """)
-
-        conn.commit()
-        conn.close()
-
-    def _extend_schema(self):
-        """Add Phase 2 tables (wallets, markets, positions).  Non-destructive."""
-        conn = sqlite3.connect(self.db_path)
-        conn.execute("PRAGMA journal_mode=WAL")
-
-        conn.executescript("""
             CREATE TABLE IF NOT EXISTS wallets (
                 address              TEXT    PRIMARY KEY,
                 name                 TEXT,
@@ -129,7 +985,9 @@ class Database:
                 num_active_positions INTEGER DEFAULT 0,
                 win_rate             REAL,
                 realized_pnl         REAL    DEFAULT 0.0,
-                last_updated         TEXT    NOT NULL
+                last_updated         TEXT    NOT NULL,
+                last_profile_attempt REAL,   -- epoch s of the last Gamma profile fetch
+                last_trade_id        INTEGER     -- trades.id the stats are current to
             );
 
             CREATE TABLE IF NOT EXISTS markets (
@@ -156,6 +1014,7 @@ class Database:
                 total_sold       REAL    DEFAULT 0.0,
                 realized_pnl     REAL    DEFAULT 0.0,
                 last_updated     TEXT    NOT NULL,
+                fifo_state       BLOB,               -- share totals + open lots, to resume FIFO
                 UNIQUE(wallet_address, condition_id, outcome)
             );
 
@@ -163,18 +1022,106 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_wallets_pnl      ON wallets(realized_pnl DESC);
             CREATE INDEX IF NOT EXISTS idx_positions_wallet ON positions(wallet_address);
             CREATE INDEX IF NOT EXISTS idx_positions_market ON positions(condition_id);
-        """)
 
-        conn.commit()
-        conn.close()
+            CREATE INDEX IF NOT EXISTS idx_trades_market  ON trades(market_id);
+            CREATE INDEX IF NOT EXISTS idx_trades_time    ON trades(match_time DESC);
+            CREATE INDEX IF NOT EXISTS idx_trades_amount  ON trades(amount DESC);
+
+            -- Wallet-filtered recent trades and wallet_analyzer's
+            -- oldest-first history: seek + ordered walk, no sort step.
+            CREATE INDEX IF NOT EXISTS idx_trades_wallet_time
+                ON trades(proxy_wallet, match_time DESC);
+
+            -- Superseded by idx_trades_wallet_time (same leading column).
+            DROP INDEX IF EXISTS idx_trades_wallet;
+            """)
+            self._migrate_derived_columns(conn)
+            self._migrate_analyzer_columns(conn)
+            self._create_rollups(conn)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _create_rollups(conn: sqlite3.Connection) -> None:
+        """
+        Rollups (_TRADE_ROLLUPS) kept current by one AFTER INSERT trigger.
+        Missing tables are created and backfilled, and the trigger
+        re-created, inside the schema transaction, so no insert can land
+        between a backfill and the trigger taking over.  Rollups are
+        derived data: an older market_stats layout is simply rebuilt.
+        """
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(market_stats)")}
+        if columns and "volume_micro" not in columns:
+            conn.execute("DROP TABLE market_stats")
+        conn.execute("DROP TRIGGER IF EXISTS trg_trades_insert")
+        existing = {r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        )}
+        for table, create_sql, _, backfill_sql in _TRADE_ROLLUPS:
+            if table not in existing:
+                conn.execute(create_sql)
+                conn.execute(backfill_sql)
+        for index_sql in _ROLLUP_INDEXES:
+            conn.execute(index_sql)
+        conn.execute(
+            "CREATE TRIGGER trg_trades_insert AFTER INSERT ON trades BEGIN"
+            + "".join(on_insert for _, _, on_insert, _ in _TRADE_ROLLUPS)
+            + "END"
+        )
+
+    def _migrate_derived_columns(self, conn: sqlite3.Connection):
+        """
+        Add any _DERIVED_TRADE_COLUMNS missing from an older database and
+        backfill them.  Runs inside _create_schema's transaction.
+        """
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(trades)")}
+        missing = [c for c in _DERIVED_TRADE_COLUMNS if c not in columns]
+        if not missing:
+            return
+        logger.info("Migrating trades: adding %s", ", ".join(missing))
+        for name in missing:
+            conn.execute(f"ALTER TABLE trades ADD COLUMN {name} INTEGER")
+        conn.execute(
+            "UPDATE trades SET "
+            + ", ".join(f"{name} = {_derived_trade_expr(name, str)}"
+                        for name in missing)
+        )
+
+    @staticmethod
+    def _migrate_analyzer_columns(conn: sqlite3.Connection):
+        """
+        Add the wallet-analyzer bookkeeping columns (_ANALYZER_COLUMNS) to
+        an older database.  Runs inside _create_schema's transaction.
+        Wallets migrated this way have no last_trade_id, so the analyzer
+        rebuilds them from their full history once.
+        """
+        for table, name, decl in _ANALYZER_COLUMNS:
+            columns = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+            if name not in columns:
+                logger.info("Migrating %s: adding %s", table, name)
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+    def _update_planner_stats(self):
+        """
+        Give the query planner index statistics so it can choose between
+        the trades indexes.  A full ANALYZE runs once on a fresh database;
+        afterwards PRAGMA optimize re-analyzes only tables that changed
+        materially.
+        """
+        conn = self._get_conn()
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+        ).fetchone()
+        conn.execute("PRAGMA optimize" if has_stats else "ANALYZE")
 
     def verify_schema(self) -> bool:
         """Return True if all required tables exist."""
-        conn = sqlite3.connect(self.db_path)
-        rows = conn.execute(
+        rows = self._get_conn().execute(
             "SELECT name FROM sqlite_master WHERE type='table'"
         ).fetchall()
-        conn.close()
         existing = {r[0] for r in rows}
         return {"trades", "traders", "wallets", "markets", "positions"}.issubset(existing)
 
@@ -187,57 +1134,80 @@ class Database:
         Insert a trade record.  Silently ignores duplicates (by transaction_hash).
         Returns True if the row was actually inserted.
         """
-        conn = self._get_conn()
-        try:
-            conn.execute(
-                """
-                INSERT OR IGNORE INTO trades (
-                    transaction_hash, market_id, token_id, proxy_wallet, side,
-                    price, size, amount, outcome, outcome_index,
-                    market_title, market_slug, market_icon, match_time
-                ) VALUES (
-                    :transaction_hash, :market_id, :token_id, :proxy_wallet, :side,
-                    :price, :size, :amount, :outcome, :outcome_index,
-                    :market_title, :market_slug, :market_icon, :match_time
-                )
-                """,
-                trade,
-            )
-            conn.commit()
-            return conn.execute("SELECT changes()").fetchone()[0] > 0
-        except Exception as exc:
-            logger.error("insert_trade failed: %s | trade=%s", exc, trade)
-            conn.rollback()
-            return False
+        return self.insert_trades([trade]) > 0
+
+    def insert_trades(self, trades: Iterable[Dict]) -> int:
+        """
+        Insert trade records in batched transactions.
+        Duplicates (by transaction_hash) are silently ignored.
+        Returns the number of rows actually inserted.
+
+        Each slice of _INSERT_BATCH_ROWS trades is one executemany in one
+        transaction (one commit, one WAL sync), so this is far cheaper per
+        row than repeated insert_trade calls, and a long stream never
+        holds a transaction larger than the page cache.  A failed slice is
+        rolled back (to a savepoint) and logged; earlier slices stay
+        committed.  Inside a caller's transaction() the slices only join
+        it: a failed one is still undone, and the caller's commit or
+        rollback decides the fate of the rest.
+        """
+        trades = iter(trades)
+        inserted = 0
+        while True:
+            batch = list(itertools.islice(trades, _INSERT_BATCH_ROWS))
+            if not batch:
+                break
+            try:
+                with self.transaction() as conn:
+                    # Scopes a failure to this slice even when the
+                    # caller's transaction stays open around it
+                    conn.execute("SAVEPOINT insert_trades")
+                    try:
+                        # INSERT OR IGNORE counts 1 per inserted row, 0 per duplicate
+                        count = conn.executemany(
+                            _INSERT_TRADE_POSITIONAL_SQL, map(_pack_trade, batch)
+                        ).rowcount
+                    except BaseException:
+                        conn.execute("ROLLBACK TO insert_trades")
+                        raise
+                    finally:
+                        conn.execute("RELEASE insert_trades")
+                    inserted += count
+            except Exception as exc:
+                logger.error("insert_trades failed: %s | batch=%d", exc, len(batch))
+        return inserted
 
     def upsert_trader(self, trader: Dict):
-        """Insert or update a trader record."""
-        conn = self._get_conn()
+        """
+        Insert or update a trader record.  An existing trader keeps its
+        num_trades / pnl_cumulative; only the profile fields are refreshed.
+        """
         try:
-            conn.execute(
-                """
-                INSERT INTO traders (
-                    proxy_wallet, name, pseudonym, profile_image, bio,
-                    num_trades, pnl_cumulative, last_updated
-                ) VALUES (
-                    :proxy_wallet, :name, :pseudonym, :profile_image, :bio,
-                    :num_trades, :pnl_cumulative, :last_updated
-                )
-                ON CONFLICT(proxy_wallet) DO UPDATE SET
-                    name           = COALESCE(excluded.name, traders.name),
-                    pseudonym      = COALESCE(excluded.pseudonym, traders.pseudonym),
-                    profile_image  = COALESCE(excluded.profile_image, traders.profile_image),
-                    bio            = COALESCE(excluded.bio, traders.bio),
-                    num_trades     = excluded.num_trades,
-                    pnl_cumulative = excluded.pnl_cumulative,
-                    last_updated   = excluded.last_updated
-                """,
-                trader,
-            )
-            conn.commit()
+            with self.transaction() as conn:
+                conn.execute(_UPSERT_TRADER_SQL, trader)
         except Exception as exc:
             logger.error("upsert_trader failed: %s", exc)
-            conn.rollback()
+
+    def upsert_traders(self, traders: Iterable[Dict]) -> None:
+        """upsert_trader for many rows: one executemany, one transaction."""
+        self._upsert_many(_UPSERT_TRADER_SQL, traders, "upsert_traders")
+
+    def existing_trade_hashes(self, hashes: Iterable[str]) -> Set[str]:
+        """
+        The subset of `hashes` already stored as trades.  Reads through
+        this thread's write connection, so inside transaction() the
+        answer stays valid until commit.  The hashes are bound as one
+        JSON array, so every call shares one prepared statement.
+        """
+        hashes = list(hashes)
+        if not hashes:
+            return set()
+        rows = self._get_conn().execute(
+            "SELECT transaction_hash FROM trades "
+            "WHERE transaction_hash IN (SELECT value FROM json_each(?))",
+            (json.dumps(hashes),),
+        )
+        return {r[0] for r in rows}
 
     # ----------------------------------------------------------------
     # Reads
@@ -249,126 +1219,188 @@ class Database:
         market_id: Optional[str] = None,
         min_amount: Optional[float] = None,
         wallet: Optional[str] = None,
+        whale_threshold: Optional[float] = None,
     ) -> List[Dict]:
-        """Return recent trades, newest first, with trader profile joined."""
-        conn = self._get_conn()
+        """
+        Return recent trades, newest first, with trader profile joined.
 
-        conditions: List[str] = []
-        params: List = []
+        If `whale_threshold` is given, each row also carries the derived
+        `size_class`, `is_whale` and `display_time` fields (see
+        AnalysisService.classify_trade), computed inside the query.
+        """
+        with self._tuple_cursor() as cur:
+            self._execute_recent_trades(
+                cur, limit, market_id, min_amount, wallet, whale_threshold
+            )
+            rows = _rows_to_dicts(cur)
+        if whale_threshold is not None:
+            # SQLite yields the comparison as 1/0
+            for row in rows:
+                row["is_whale"] = bool(row["is_whale"])
+        return rows
 
-        if market_id:
-            conditions.append("t.market_id = ?")
-            params.append(market_id)
-        if min_amount is not None:
-            conditions.append("t.amount >= ?")
-            params.append(min_amount)
-        if wallet:
-            conditions.append("t.proxy_wallet = ?")
-            params.append(wallet)
-
-        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
-        params.append(limit)
+    def get_recent_trades_json(
+        self,
+        limit: int = 100,
+        market_id: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        wallet: Optional[str] = None,
+        whale_threshold: Optional[float] = None,
+    ) -> str:
+        """
+        get_recent_trades as a ready-to-send JSON array, built by SQLite
+        (json_group_array) — no per-row tuples or dicts in Python.
+        SQLite writes REAL values to 15 significant digits.
+        """
+        with self._tuple_cursor() as cur:
+            self._execute_recent_trades(
+                cur, limit, market_id, min_amount, wallet, whale_threshold,
+                _RECENT_TRADES_JSON_SQL,
+            )
+            return cur.fetchone()[0]
 
-        rows = conn.execute(
-            f"""
-            SELECT
-                t.*,
-                tr.name        AS trader_name,
-                tr.pseudonym   AS trader_pseudonym,
-                tr.profile_image AS trader_profile_image
-            FROM trades t
-            LEFT JOIN traders tr ON t.proxy_wallet = tr.proxy_wallet
-            {where}
-            ORDER BY t.match_time DESC
-            LIMIT ?
-            """,
-            params,
-        ).fetchall()
+    def iter_trades(
+        self,
+        limit: int = 100,
+        market_id: Optional[str] = None,
+        min_amount: Optional[float] = None,
+        wallet: Optional[str] = None,
+        whale_threshold: Optional[float] = None,
+    ) -> Iterator[Dict]:
+        """
+        Generator form of get_recent_trades: rows are pulled from the cursor
+        one at a time instead of materialising the whole result set.
+        """
+        with self._tuple_cursor() as cur:
+            self._execute_recent_trades(
+                cur, limit, market_id, min_amount, wallet, whale_threshold
+            )
+            cols = [d[0] for d in cur.description]
+            derived = whale_threshold is not None
+            for row in cur:
+                trade = dict(zip(cols, row))
+                if derived:
+                    trade["is_whale"] = bool(trade["is_whale"])
+                yield trade
 
-        return [dict(r) for r in rows]
+    @staticmethod
+    def _execute_recent_trades(
+        cur: sqlite3.Cursor,
+        limit: int,
+        market_id: Optional[str],
+        min_amount: Optional[float],
+        wallet: Optional[str],
+        whale_threshold: Optional[float],
+        variants: Dict[Tuple[bool, bool], str] = _RECENT_TRADES_SQL,
+    ) -> sqlite3.Cursor:
+        """Run the recent-trades query on `cur`, leaving it ready to fetch."""
+        sql = variants[(whale_threshold is not None, bool(wallet))]
+        cur.execute(sql, {
+            "market_id":  market_id or None,
+            "min_amount": min_amount,
+            "wallet":     wallet,
+            "limit":      limit,
+            "whale":      whale_threshold,
+            "medium":     whale_threshold * 0.1 if whale_threshold is not None else None,
+        })
 
     def get_stats(self, market_id: Optional[str] = None) -> Dict:
         """Aggregate stats: counts, volume, etc."""
-        conn = self._get_conn()
-        params = [market_id] if market_id else []
-        where = "WHERE market_id = ?" if market_id else ""
-
-        row = conn.execute(
-            f"""
-            SELECT
-                COUNT(*)                    AS total_trades,
-                COALESCE(SUM(amount), 0)    AS total_volume,
-                COALESCE(AVG(amount), 0)    AS avg_trade_size,
-                COALESCE(MAX(amount), 0)    AS largest_trade,
-                COUNT(DISTINCT proxy_wallet) AS unique_traders
-            FROM trades {where}
-            """,
-            params,
-        ).fetchone()
+        with self._tuple_cursor() as cur:
+            # Everything comes from the trigger-maintained rollups:
+            # totals from market_stats, unique_traders from trader_stats.
+            if market_id:
+                totals = cur.execute(
+                    """
+                    SELECT total_trades, volume_micro, largest_micro
+                    FROM market_stats WHERE market_id = ?
+                    """,
+                    (market_id,),
+                ).fetchone()
+                unique_traders = cur.execute(
+                    "SELECT COUNT(*) FROM trader_stats WHERE market_id = ?",
+                    (market_id,),
+                ).fetchone()[0]
+            else:
+                totals = cur.execute(
+                    """
+                    SELECT SUM(total_trades), SUM(volume_micro), MAX(largest_micro)
+                    FROM market_stats
+                    """
+                ).fetchone()
+                unique_traders = cur.execute(
+                    "SELECT COUNT(DISTINCT proxy_wallet) FROM trader_stats"
+                ).fetchone()[0]
 
-        return dict(row)
+            total_trades, volume_micro, largest_micro = totals or (0, 0, 0)
+            total_trades = total_trades or 0
+            total_volume = (volume_micro or 0) / 1_000_000
+            return {
+                "total_trades":   total_trades,
+                "total_volume":   total_volume,
+                "avg_trade_size": total_volume / total_trades if total_trades else 0,
+                "largest_trade":  (largest_micro or 0) / 1_000_000,
+                "unique_traders": unique_traders,
+            }
 
     def get_volume_by_outcome(self, market_id: Optional[str] = None) -> List[Dict]:
         """Volume breakdown by outcome × side."""
-        conn = self._get_conn()
-        params = [market_id] if market_id else []
-        where = "WHERE market_id = ?" if market_id else ""
-
-        rows = conn.execute(
-            f"""
-            SELECT
-                outcome,
-                side,
-                COUNT(*)        AS trade_count,
-                SUM(amount)     AS volume,
-                AVG(price)      AS avg_price
-            FROM trades {where}
-            GROUP BY outcome, side
-            ORDER BY outcome, side
-            """,
-            params,
-        ).fetchall()
+        with self._tuple_cursor() as cur:
+            if market_id:
+                cur.execute(_VOLUME_BY_OUTCOME_SQL[True], (market_id,))
+            else:
+                cur.execute(_VOLUME_BY_OUTCOME_SQL[False])
+            return _rows_to_dicts(cur)
 
-        return [dict(r) for r in rows]
+    def get_volume_pivot(self, market_id: Optional[str] = None) -> List[Dict]:
+        """
+        Volume by outcome with BUY / SELL side by side: outcome,
+        buy_volume, sell_volume, buy_count, sell_count and avg_price (of
+        buys).  Pivoted in SQL from the outcome_stats rollup.
+        """
+        with self._tuple_cursor() as cur:
+            if market_id:
+                cur.execute(_VOLUME_PIVOT_SQL[True], (market_id,))
+            else:
+                cur.execute(_VOLUME_PIVOT_SQL[False])
+            return _rows_to_dicts(cur)
 
     def get_top_traders(
         self,
         market_id: Optional[str] = None,
         limit: int = 20,
+        after: Optional[Tuple[float, str]] = None,
+        whale_threshold: Optional[float] = None,
     ) -> List[Dict]:
-        """Top traders by total USDC volume traded."""
-        conn = self._get_conn()
+        """
+        Top traders by total USDC volume traded.  Pass the last row's
+        (total_volume, proxy_wallet) as `after` for the next page.
+
+        If `whale_threshold` is given, each row also carries a `size_class`
+        (whale / medium / small by total_volume), computed inside the query.
+        """
+        sql, params = self._top_traders_query(market_id, limit, after, whale_threshold)
+        with self._tuple_cursor() as cur:
+            return _rows_to_dicts(cur.execute(sql, params))
+
+    @staticmethod
+    def _top_traders_query(
+        market_id: Optional[str],
+        limit: int,
+        after: Optional[Tuple[float, str]],
+        whale_threshold: Optional[float] = None,
+    ):
         params: List = []
-        where = ""
+        if whale_threshold is not None:
+            params.extend((whale_threshold, whale_threshold * 0.1))
         if market_id:
-            where = "WHERE t.market_id = ?"
             params.append(market_id)
+        if after is not None:
+            last_volume, last_wallet = after
+            params.extend((int(round(last_volume * 1_000_000)), last_wallet))
         params.append(limit)
-
-        rows = conn.execute(
-            f"""
-            SELECT
-                t.proxy_wallet,
-                tr.name,
-                tr.pseudonym,
-                tr.profile_image,
-                COUNT(t.id)           AS trade_count,
-                SUM(t.amount)         AS total_volume,
-                SUM(CASE WHEN t.side='BUY'  THEN t.amount ELSE 0 END) AS buy_volume,
-                SUM(CASE WHEN t.side='SELL' THEN t.amount ELSE 0 END) AS sell_volume,
-                MAX(t.amount)         AS largest_trade,
-                MAX(t.match_time)     AS last_trade_time
-            FROM trades t
-            LEFT JOIN traders tr ON t.proxy_wallet = tr.proxy_wallet
-            {where}
-            GROUP BY t.proxy_wallet
-            ORDER BY total_volume DESC
-            LIMIT ?
-            """,
-            params,
-        ).fetchall()
-
-        return [dict(r) for r in rows]
+        key = (bool(market_id), after is not None, whale_threshold is not None)
+        return _TOP_TRADERS_SQL[key], params
 
     # ----------------------------------------------------------------
     # CSV Export
@@ -380,40 +1412,57 @@ class Database:
         market_id: Optional[str] = None,
         min_amount: Optional[float] = None,
         limit: int = 100_000,
+        engine: str = "csv",
     ) -> int:
-        """Write trades to a CSV file. Returns the number of rows written."""
-        trades = self.get_recent_trades(
-            limit=limit, market_id=market_id, min_amount=min_amount
-        )
-        if not trades:
-            return 0
+        """
+        Write trades to a CSV file. Returns the number of rows written.
 
-        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
-        with open(filepath, "w", newline="", encoding="utf-8") as fh:
-            writer = csv.DictWriter(fh, fieldnames=list(trades[0].keys()))
-            writer.writeheader()
-            writer.writerows(trades)
+        The file is written under a temporary name and renamed into place,
+        so concurrent readers never see a partial export.
 
-        return len(trades)
+        engine — "csv" (the default) streams rows through the stdlib csv
+        writer in constant memory.  "arrow" (requires pyarrow) is opt-in:
+        it writes with pyarrow's vectorized, GIL-releasing CSV writer,
+        faster for large exports, but the output differs:
 
-    def export_csv_bytes(
-        self,
-        market_id: Optional[str] = None,
-        min_amount: Optional[float] = None,
-        limit: int = 100_000,
-    ) -> bytes:
-        """Return CSV content as bytes (for HTTP response streaming)."""
-        trades = self.get_recent_trades(
-            limit=limit, market_id=market_id, min_amount=min_amount
-        )
-        if not trades:
-            return b""
+        - the whole result (up to `limit` rows, 100k by default) is held
+          in memory as a columnar table first;
+        - every string value and header name is quoted, where csv quotes
+          only values containing a delimiter, quote or newline;
+        - numbers are formatted by Arrow, not Python's repr (e.g. a
+          whole-number REAL is written as 1500 instead of 1500.0).
+        """
+        if engine not in _CSV_ENGINES:
+            raise ValueError(f"Unknown CSV engine: {engine!r}")
+        if engine == "arrow" and pa is None:
+            raise RuntimeError("engine='arrow' requires pyarrow")
+
+        with self._tuple_cursor() as cur:
+            self._execute_recent_trades(cur, limit, market_id, min_amount, None, None)
+            rows = cur.fetchmany(_CSV_FETCH_ROWS)
+            if not rows:
+                return 0
+
+            columns = [d[0] for d in cur.description]
+            os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+            tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
 
-        buf = io.StringIO()
-        writer = csv.DictWriter(buf, fieldnames=list(trades[0].keys()))
-        writer.writeheader()
-        writer.writerows(trades)
-        return buf.getvalue().encode("utf-8")
+            if engine == "arrow":
+                table = _cursor_to_arrow(cur, rows)
+                count = table.num_rows
+                pa_csv.write_csv(table, tmp_path)
+            else:
+                count = 0
+                with open(tmp_path, "w", newline="", encoding="utf-8") as fh:
+                    writer = csv.writer(fh)
+                    writer.writerow(columns)
+                    while rows:
+                        writer.writerows(rows)
+                        count += len(rows)
+                        rows = cur.fetchmany(_CSV_FETCH_ROWS)
+        os.replace(tmp_path, filepath)
+
+        return count
 
     # ================================================================
     # Phase 2 — Wallets
@@ -421,111 +1470,241 @@ class Database:
 
     def upsert_wallet(self, wallet: Dict) -> None:
         """Insert or update an aggregated wallet row."""
-        conn = self._get_conn()
         try:
-            conn.execute(
-                """
-                INSERT INTO wallets (
-                    address, name, pseudonym, profile_image, bio,
-                    first_seen, last_seen, total_trades, total_volume,
-                    total_buy_volume, total_sell_volume, largest_trade,
-                    avg_trade_size, num_active_positions, win_rate,
-                    realized_pnl, last_updated
-                ) VALUES (
-                    :address, :name, :pseudonym, :profile_image, :bio,
-                    :first_seen, :last_seen, :total_trades, :total_volume,
-                    :total_buy_volume, :total_sell_volume, :largest_trade,
-                    :avg_trade_size, :num_active_positions, :win_rate,
-                    :realized_pnl, :last_updated
-                )
-                ON CONFLICT(address) DO UPDATE SET
-                    name             = COALESCE(excluded.name,          wallets.name),
-                    pseudonym        = COALESCE(excluded.pseudonym,     wallets.pseudonym),
-                    profile_image    = COALESCE(excluded.profile_image, wallets.profile_image),
-                    bio              = COALESCE(excluded.bio,           wallets.bio),
-                    first_seen       = excluded.first_seen,
-                    last_seen        = excluded.last_seen,
-                    total_trades     = excluded.total_trades,
-                    total_volume     = excluded.total_volume,
-                    total_buy_volume = excluded.total_buy_volume,
-                    total_sell_volume= excluded.total_sell_volume,
-                    largest_trade    = excluded.largest_trade,
-                    avg_trade_size   = excluded.avg_trade_size,
-                    num_active_positions = excluded.num_active_positions,
-                    win_rate         = excluded.win_rate,
-                    realized_pnl     = excluded.realized_pnl,
-                    last_updated     = excluded.last_updated
-                """,
-                wallet,
-            )
-            conn.commit()
+            with self.transaction() as conn:
+                conn.execute(_UPSERT_WALLET_SQL, wallet)
         except Exception as exc:
             logger.error("upsert_wallet failed: %s", exc)
-            conn.rollback()
+
+    def upsert_wallets(self, wallets: Iterable[Dict]) -> None:
+        """
+        upsert_wallet for many rows: one executemany, one transaction.
+        Errors propagate instead of being logged, so WalletAnalyzer's
+        enclosing transaction() — stats, positions and last_trade_id
+        together — commits or rolls back as a whole.
+        """
+        with self.transaction() as conn:
+            conn.executemany(_UPSERT_WALLET_SQL, wallets)
+
+    def _upsert_many(self, sql: str, rows: Iterable[Dict], name: str) -> None:
+        """
+        executemany `sql` over `rows` in one transaction.  If a row violates
+        a constraint (e.g. a position whose market isn't fetched yet), the
+        rows are replayed one statement at a time so only that row is lost.
+        The upserts are idempotent, so rows already applied are harmless.
+        """
+        rows = list(rows)
+        try:
+            with self.transaction() as conn:
+                conn.executemany(sql, rows)
+            return
+        except sqlite3.IntegrityError:
+            pass
+        except Exception as exc:
+            logger.error("%s failed: %s | rows=%d", name, exc, len(rows))
+            return
+        with self.transaction() as conn:
+            for row in rows:
+                try:
+                    conn.execute(sql, row)
+                except sqlite3.Error as exc:
+                    logger.error("%s failed: %s", name, exc)
+
+    def update_wallet_profiles(self, profiles: Iterable[Dict]) -> None:
+        """
+        Set profile fields (name, pseudonym, profile_image, bio; NULLs keep
+        the stored value) and last_profile_attempt on existing wallet rows:
+        one executemany, one transaction.
+        """
+        self._upsert_many(_UPDATE_WALLET_PROFILE_SQL, profiles, "update_wallet_profiles")
 
     def get_wallet(self, address: str) -> Optional[Dict]:
         """Return the wallets row for an address, or None."""
-        conn = self._get_conn()
-        row = conn.execute(
-            "SELECT * FROM wallets WHERE address = ?", (address,)
-        ).fetchone()
-        return dict(row) if row else None
+        with self._dict_cursor() as cur:
+            row = cur.execute(
+                "SELECT * FROM wallets WHERE address = ?", (address,)
+            ).fetchone()
+            return dict(row) if row else None
 
     def get_wallets(
         self,
         limit: int = 50,
         order_by: str = "total_volume",
         min_volume: Optional[float] = None,
+        after: Optional[Tuple] = None,
     ) -> List[Dict]:
-        """Top wallets sorted by the given column (SQL-injection safe)."""
-        _allowed = {"total_volume", "realized_pnl", "total_trades", "last_seen"}
-        if order_by not in _allowed:
+        """
+        Top wallets sorted by the given column (SQL-injection safe).
+        Unknown `order_by` values fall back to total_volume.  Pass the
+        last row's (<order_by value>, address) as `after` for the next
+        page; ties are broken by address.
+        """
+        if order_by not in _WALLET_ORDER_COLUMNS:
             order_by = "total_volume"
-        conn = self._get_conn()
         params: List = []
-        where = ""
         if min_volume is not None:
-            where = "WHERE total_volume >= ?"
             params.append(min_volume)
+        if after is not None:
+            params.extend(after)
         params.append(limit)
-        rows = conn.execute(
-            f"SELECT * FROM wallets {where} ORDER BY {order_by} DESC LIMIT ?",
-            params,
-        ).fetchall()
-        return [dict(r) for r in rows]
+        sql = _WALLETS_SQL[(order_by, min_volume is not None, after is not None)]
+        with self._tuple_cursor() as cur:
+            cur.execute(sql, params)
+            return _rows_to_dicts(cur)
 
     def get_trader(self, proxy_wallet: str) -> Optional[Dict]:
         """Return the traders row for this wallet (profile snapshot from ingestion)."""
-        conn = self._get_conn()
-        row = conn.execute(
-            "SELECT * FROM traders WHERE proxy_wallet = ?", (proxy_wallet,)
-        ).fetchone()
-        return dict(row) if row else None
+        with self._dict_cursor() as cur:
+            row = cur.execute(
+                "SELECT * FROM traders WHERE proxy_wallet = ?", (proxy_wallet,)
+            ).fetchone()
+            return dict(row) if row else None
+
+    def get_known_profiles(self) -> Dict[str, Dict]:
+        """
+        Every wallet with a name or pseudonym on record, mapped to its
+        profile (name, pseudonym, profile_image, bio).  The traders row
+        (fresh from ingestion) wins over our own wallets enrichment.
+        """
+        profiles: Dict[str, Dict] = {}
+        with self._dict_cursor() as cur:
+            for table, key in (("wallets", "address"), ("traders", "proxy_wallet")):
+                rows = cur.execute(
+                    f"SELECT {key} AS address, name, pseudonym, profile_image, bio "
+                    f"FROM {table} "
+                    "WHERE COALESCE(name, '') != '' OR COALESCE(pseudonym, '') != ''"
+                )
+                for row in rows:
+                    profile = dict(row)
+                    profiles[profile.pop("address")] = profile
+        return profiles
+
+    def get_profile_attempts(self) -> Dict[str, float]:
+        """last_profile_attempt (epoch s) for every wallet that has one."""
+        with self._tuple_cursor() as cur:
+            rows = cur.execute(
+                "SELECT address, last_profile_attempt FROM wallets "
+                "WHERE last_profile_attempt IS NOT NULL"
+            )
+            return dict(rows.fetchall())
+
+    def get_recent_trade_hashes(self, limit: int) -> List[str]:
+        """Transaction hashes of the latest `limit` trades, newest first."""
+        with self._tuple_cursor() as cur:
+            rows = cur.execute(
+                """
+                SELECT transaction_hash FROM trades
+                WHERE transaction_hash IS NOT NULL
+                ORDER BY match_time DESC
+                LIMIT ?
+                """,
+                (limit,),
+            ).fetchall()
+            return [r[0] for r in rows]
 
     def get_distinct_wallets_from_trades(self) -> List[str]:
         """All distinct proxy_wallet values seen in the trades table."""
-        conn = self._get_conn()
-        rows = conn.execute(
-            "SELECT DISTINCT proxy_wallet FROM trades"
-        ).fetchall()
-        return [r[0] for r in rows]
+        with self._tuple_cursor() as cur:
+            rows = cur.execute(
+                "SELECT DISTINCT proxy_wallet FROM trades"
+            ).fetchall()
+            return [r[0] for r in rows]
 
     def get_trades_for_wallet(self, address: str) -> List[Dict]:
+        """All trades for a wallet, sorted oldest-first, as a list."""
+        return list(self.iter_trades_for_wallet(address))
+
+    def iter_trades_for_wallet(self, address: str) -> Iterator[Dict]:
         """
-        All trades for a wallet, sorted oldest-first.
-        Used by wallet_analyzer for FIFO PnL computation.
+        Yield a wallet's trades oldest-first, one at a time, without
+        materialising the result set.  Used by wallet_analyzer for FIFO
+        PnL computation, in a single pass.
         """
-        conn = self._get_conn()
-        rows = conn.execute(
-            """
-            SELECT market_id, outcome, side, price, size, amount, match_time
-            FROM trades
-            WHERE proxy_wallet = ?
-            ORDER BY match_time ASC
-            """,
-            (address,),
-        ).fetchall()
-        return [dict(r) for r in rows]
+        with self._tuple_cursor() as cur:
+            cur.execute(
+                """
+                SELECT market_id, outcome, side, price, size, amount, match_time
+                FROM trades
+                WHERE proxy_wallet = ?
+                ORDER BY match_time ASC
+                """,
+                (address,),
+            )
+            cols = [d[0] for d in cur.description]
+            for row in cur:
+                yield dict(zip(cols, row))
+
+    def iter_trades_grouped_by_wallet(
+        self,
+        upto_id: int,
+        after_id: Optional[int] = None,
+    ) -> Iterator[Tuple[str, Iterator[Tuple]]]:
+        """
+        Yield (proxy_wallet, trades) for every wallet with trades up to
+        trades.id `upto_id`, each wallet's trades oldest-first as in
+        iter_trades_for_wallet.  Each trade is the row tuple itself —
+        (proxy_wallet, market_id, outcome, side, price, size, amount,
+        match_time) — for the consumer to unpack: no dict is built per
+        trade.
+
+        With `after_id` None, each wallet's full history.  Otherwise only
+        trades newer than both `after_id` and the wallet's own
+        wallets.last_trade_id — the ones not yet folded into its stats —
+        and only the wallets that have any.
+
+        One ordered walk split with itertools.groupby (wallets descending),
+        instead of a DISTINCT query plus one lookup per wallet.  Each
+        group must be consumed before advancing to the next; the read
+        connection is held until the generator finishes.  price / size /
+        amount are always floats and match_time an int, so consumers need
+        no per-row conversion.
+        """
+        with self._tuple_cursor() as cur:
+            if after_id is None:
+                cur.execute(_WALLET_HISTORY_SQL, (upto_id,))
+            else:
+                cur.execute(_WALLET_NEW_TRADES_SQL, (after_id, upto_id))
+            yield from itertools.groupby(cur, key=operator.itemgetter(0))
+
+    def get_max_trade_id(self) -> int:
+        """Highest trades.id (0 when there are no trades)."""
+        with self._tuple_cursor() as cur:
+            return cur.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()[0]
+
+    def get_wallet_watermarks(self) -> Dict[str, int]:
+        """wallets.last_trade_id for every wallet that has one."""
+        with self._tuple_cursor() as cur:
+            rows = cur.execute(
+                "SELECT address, last_trade_id FROM wallets "
+                "WHERE last_trade_id IS NOT NULL"
+            )
+            return dict(rows.fetchall())
+
+    def get_wallet_state(self, address: str) -> Tuple[Optional[Dict], List[Dict]]:
+        """
+        The stored aggregates WalletAnalyzer resumes from: the wallets row
+        (None if absent) and every positions row of the wallet with its
+        fifo_state, in insertion order.
+        """
+        with self._dict_cursor() as cur:
+            row = cur.execute(
+                """
+                SELECT first_seen, last_seen, total_trades, total_volume,
+                       total_buy_volume, total_sell_volume, largest_trade
+                FROM wallets WHERE address = ?
+                """,
+                (address,),
+            ).fetchone()
+            positions = cur.execute(
+                """
+                SELECT condition_id, outcome, total_bought, total_sold,
+                       realized_pnl, fifo_state
+                FROM positions WHERE wallet_address = ?
+                ORDER BY id
+                """,
+                (address,),
+            ).fetchall()
+            return (dict(row) if row else None), [dict(p) for p in positions]
 
     # ================================================================
     # Phase 2 — Positions
@@ -533,48 +1712,37 @@ class Database:
 
     def upsert_position(self, position: Dict) -> None:
         """Insert or replace a wallet position row."""
-        conn = self._get_conn()
         try:
-            conn.execute(
-                """
-                INSERT INTO positions (
-                    wallet_address, condition_id, outcome,
-                    net_shares, avg_entry_price, total_bought, total_sold,
-                    realized_pnl, last_updated
-                ) VALUES (
-                    :wallet_address, :condition_id, :outcome,
-                    :net_shares, :avg_entry_price, :total_bought, :total_sold,
-                    :realized_pnl, :last_updated
-                )
-                ON CONFLICT(wallet_address, condition_id, outcome) DO UPDATE SET
-                    net_shares      = excluded.net_shares,
-                    avg_entry_price = excluded.avg_entry_price,
-                    total_bought    = excluded.total_bought,
-                    total_sold      = excluded.total_sold,
-                    realized_pnl    = excluded.realized_pnl,
-                    last_updated    = excluded.last_updated
-                """,
-                position,
-            )
-            conn.commit()
+            with self.transaction() as conn:
+                conn.execute(_UPSERT_POSITION_SQL, position)
         except Exception as exc:
             logger.error("upsert_position failed: %s", exc)
-            conn.rollback()
+
+    def upsert_positions(self, positions: Iterable[Dict]) -> None:
+        """
+        upsert_position for many rows: one executemany, one transaction.
+        Errors propagate, as in upsert_wallets.
+        """
+        with self.transaction() as conn:
+            conn.executemany(_UPSERT_POSITION_SQL, positions)
 
     def get_positions_for_wallet(self, address: str) -> List[Dict]:
         """All positions for a wallet, joined with market title."""
-        conn = self._get_conn()
-        rows = conn.execute(
-            """
-            SELECT p.*, m.title AS market_title, m.slug AS market_slug
-            FROM positions p
-            LEFT JOIN markets m ON p.condition_id = m.condition_id
-            WHERE p.wallet_address = ?
-            ORDER BY p.net_shares DESC, p.realized_pnl DESC
-            """,
-            (address,),
-        ).fetchall()
-        return [dict(r) for r in rows]
+        with self._tuple_cursor() as cur:
+            cur.execute(
+                """
+                SELECT p.id, p.wallet_address, p.condition_id, p.outcome,
+                       p.net_shares, p.avg_entry_price, p.total_bought,
+                       p.total_sold, p.realized_pnl, p.last_updated,
+                       m.title AS market_title, m.slug AS market_slug
+                FROM positions p
+                LEFT JOIN markets m ON p.condition_id = m.condition_id
+                WHERE p.wallet_address = ?
+                ORDER BY p.net_shares DESC, p.realized_pnl DESC
+                """,
+                (address,),
+            )
+            return _rows_to_dicts(cur)
 
     # ================================================================
     # Phase 2 — Markets
@@ -582,55 +1750,77 @@ class Database:
 
     def upsert_market(self, market: Dict) -> None:
         """Insert or update a market metadata row."""
-        conn = self._get_conn()
         try:
-            conn.execute(
-                """
-                INSERT INTO markets (
-                    condition_id, title, slug, icon, description, category,
-                    end_date, resolved, winning_outcome, last_fetched
-                ) VALUES (
-                    :condition_id, :title, :slug, :icon, :description, :category,
-                    :end_date, :resolved, :winning_outcome, :last_fetched
-                )
-                ON CONFLICT(condition_id) DO UPDATE SET
-                    title           = COALESCE(excluded.title,           markets.title),
-                    slug            = COALESCE(excluded.slug,            markets.slug),
-                    icon            = COALESCE(excluded.icon,            markets.icon),
-                    description     = COALESCE(excluded.description,     markets.description),
-                    category        = COALESCE(excluded.category,        markets.category),
-                    end_date        = COALESCE(excluded.end_date,        markets.end_date),
-                    resolved        = excluded.resolved,
-                    winning_outcome = COALESCE(excluded.winning_outcome, markets.winning_outcome),
-                    last_fetched    = excluded.last_fetched
-                """,
-                market,
-            )
-            conn.commit()
+            with self.transaction() as conn:
+                conn.execute(_UPSERT_MARKET_SQL, market)
         except Exception as exc:
             logger.error("upsert_market failed: %s", exc)
-            conn.rollback()
+
+    def upsert_markets(self, markets: Iterable[Dict]) -> None:
+        """upsert_market for many rows: one executemany, one transaction."""
+        self._upsert_many(_UPSERT_MARKET_SQL, markets, "upsert_markets")
+
+    def ensure_markets(self, condition_ids: Iterable[str]) -> None:
+        """
+        Insert a placeholder markets row for each condition ID not stored
+        yet, so positions can reference it before MarketAnalyzer fetches
+        its metadata.  The empty last_fetched makes it stale, i.e. fetched
+        on MarketAnalyzer's next run.  Errors propagate, as in
+        upsert_wallets.
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO markets (condition_id, last_fetched) VALUES (?, '') "
+                "ON CONFLICT(condition_id) DO NOTHING",
+                ((cid,) for cid in condition_ids),
+            )
+
+    def get_stale_market_ids(self, fetched_before: str) -> List[str]:
+        """
+        Markets seen in trades whose metadata was never fetched, or last
+        fetched before the ISO-8601 timestamp `fetched_before`.  One row
+        per traded market comes from the market_stats rollup; a
+        last_fetched that doesn't parse counts as stale.
+        """
+        with self._tuple_cursor() as cur:
+            rows = cur.execute(
+                """
+                SELECT s.market_id
+                FROM market_stats s
+                LEFT JOIN markets m ON m.condition_id = s.market_id
+                WHERE julianday(m.last_fetched) IS NULL
+                   OR julianday(m.last_fetched) < julianday(?)
+                """,
+                (fetched_before,),
+            ).fetchall()
+            return [r[0] for r in rows]
 
     def get_market(self, condition_id: str) -> Optional[Dict]:
         """Return the markets row for a condition ID, or None."""
-        conn = self._get_conn()
-        row = conn.execute(
-            "SELECT * FROM markets WHERE condition_id = ?", (condition_id,)
-        ).fetchone()
-        return dict(row) if row else None
+        with self._dict_cursor() as cur:
+            row = cur.execute(
+                "SELECT * FROM markets WHERE condition_id = ?", (condition_id,)
+            ).fetchone()
+            return dict(row) if row else None
 
     def get_markets(self, limit: int = 50) -> List[Dict]:
-        """Return market rows ordered alphabetically by title."""
-        conn = self._get_conn()
-        rows = conn.execute(
-            "SELECT * FROM markets ORDER BY title ASC LIMIT ?", (limit,)
-        ).fetchall()
-        return [dict(r) for r in rows]
+        """
+        Return market rows ordered alphabetically by title.  Rows without
+        a title yet (ensure_markets placeholders, or markets the API had
+        no metadata for) are left out rather than sorted first.
+        """
+        with self._tuple_cursor() as cur:
+            cur.execute(
+                "SELECT * FROM markets WHERE title IS NOT NULL "
+                "ORDER BY title ASC LIMIT ?",
+                (limit,),
+            )
+            return _rows_to_dicts(cur)
 
     def get_distinct_markets_from_trades(self) -> List[str]:
         """All distinct market_id values seen in the trades table."""
-        conn = self._get_conn()
-        rows = conn.execute(
-            "SELECT DISTINCT market_id FROM trades"
-        ).fetchall()
-        return [r[0] for r in rows]
+        with self._tuple_cursor() as cur:
+            rows = cur.execute(
+                "SELECT DISTINCT market_id FROM trades"
+            ).fetchall()
+            return [r[0] for r in rows]
@@ -6,22 +6,26 @@ Main entry point for poly-analysis-v1.
 
 Execution order
 ---------------
-1. Run scripts/health_check.py as a subprocess.
+1. Run the scripts/health_check.py checks in-process.
 2. Abort if health check returns exit code != 0.
 3. Initialise DB, services, Flask app.
 4. Start the ingestion service (background threads).
-5. Start Flask (blocking, main thread).
+5. Serve the app (blocking): gunicorn gthread in production, or the
+   Flask dev server when FLASK_DEBUG=true / gunicorn is unavailable.
 
 Usage
 -----
-    python run.py
+    python run.py                       # health check, then serve
+    python run.py --skip-healthcheck    # serve straight away
+    python run.py --healthcheck-only    # health check, exit with its code
+    python run.py --rebuild-wallets     # recompute wallet analytics from all trades
 """
 
+import argparse
 import logging
 import os
-import subprocess
 import sys
-import time
+from types import SimpleNamespace
 
 # ----------------------------------------------------------------
 # Ensure project root is importable
@@ -43,10 +47,90 @@ def _setup_logging(logs_dir: str, debug: bool = False) -> None:
 
 
 def _run_health_check() -> int:
-    """Invoke health_check.py as a subprocess; return its exit code."""
-    script = os.path.join(_ROOT, "scripts", "health_check.py")
-    result = subprocess.run([sys.executable, script])
-    return result.returncode
+    """Run the health checks in this interpreter; return the exit code."""
+    from scripts.health_check import run as health_run
+    return health_run()
+
+
+def _serve_gunicorn(app, config, on_worker_start) -> None:
+    """
+    Serve `app` with an embedded gunicorn: one gthread worker with
+    `config.web_threads` threads.
+
+    Background services live in the serving process (the status endpoint
+    reads their counters), so they are started in the worker via
+    `post_worker_init` and a single worker is used — more workers would
+    each run their own ingestion loop.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class _Server(BaseApplication):
+        def load_config(self):
+            settings = {
+                "bind":             f"{config.flask_host}:{config.flask_port}",
+                "workers":          1,
+                "worker_class":     "gthread",
+                "threads":          config.web_threads,
+                "post_worker_init": lambda worker: on_worker_start(),
+            }
+            if os.path.isdir("/dev/shm"):
+                settings["worker_tmp_dir"] = "/dev/shm"  # heartbeat file off disk
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    _Server().run()
+
+
+def _load_runtime() -> SimpleNamespace:
+    """
+    Import the storage, service and web modules.  Deferred until the health
+    check has passed, so a failing or --healthcheck-only start never pays
+    for Flask and the service stack.
+    """
+    from conf.config import Config
+    from db import Database
+    from services.analysis         import AnalysisService
+    from services.ingestion        import IngestionService
+    from services.polymarket_client import PolymarketClient
+    from services.wallet_analyzer  import WalletAnalyzer
+    from services.market_analyzer  import MarketAnalyzer
+    from services.scanner          import ScannerService
+    from app.app import READ_FANOUT_WORKERS, create_app
+
+    return SimpleNamespace(
+        Config=Config,
+        Database=Database,
+        AnalysisService=AnalysisService,
+        IngestionService=IngestionService,
+        PolymarketClient=PolymarketClient,
+        WalletAnalyzer=WalletAnalyzer,
+        MarketAnalyzer=MarketAnalyzer,
+        ScannerService=ScannerService,
+        READ_FANOUT_WORKERS=READ_FANOUT_WORKERS,
+        create_app=create_app,
+    )
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Poly Analysis v1")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--skip-healthcheck", action="store_true",
+        help="start services without the pre-flight health check",
+    )
+    mode.add_argument(
+        "--healthcheck-only", action="store_true",
+        help="run the pre-flight health check and exit with its status",
+    )
+    parser.add_argument(
+        "--rebuild-wallets", action="store_true",
+        help="recompute every wallet's stats and positions from its full "
+             "trade history instead of only the new trades",
+    )
+    return parser.parse_args(argv)
 
 
 def _banner(msg: str) -> None:
@@ -60,6 +144,8 @@ def _banner(msg: str) -> None:
 # Main
 # ----------------------------------------------------------------
 def main() -> None:
+    args = _parse_args()
+
     # Minimal bootstrap so we can read LOGS_DIR / FLASK_DEBUG before
     # the full Config object is ready.
     from dotenv import load_dotenv
@@ -74,18 +160,25 @@ def main() -> None:
     _banner("Poly Analysis v1 — Starting up")
 
     # ---- Health check --------------------------------------------------
-    print("Running pre-flight health check…\n")
-    exit_code = _run_health_check()
+    if args.skip_healthcheck:
+        logger.warning("Skipping pre-flight health check (--skip-healthcheck)")
+    else:
+        print("Running pre-flight health check…\n")
+        exit_code = _run_health_check()
 
-    if exit_code != 0:
-        print("\n❌  Health check failed — fix the issues above and try again.\n")
-        sys.exit(1)
+        if args.healthcheck_only:
+            sys.exit(exit_code)
 
-    print("\n✅  Health check passed — initialising services…\n")
+        if exit_code != 0:
+            print("\n❌  Health check failed — fix the issues above and try again.\n")
+            sys.exit(1)
+
+        print("\n✅  Health check passed — initialising services…\n")
+
+    rt = _load_runtime()
 
     # ---- Config --------------------------------------------------------
-    from conf.config import Config
-    config = Config.from_env()
+    config = rt.Config.from_env()
     errors = config.validate()
     if errors:
         for err in errors:
@@ -98,57 +191,84 @@ def main() -> None:
     os.makedirs(config.output_dir, exist_ok=True)
     os.makedirs(config.logs_dir,   exist_ok=True)
 
-    from db import Database
-    db = Database(config.db_path)
+    # Readers (pooled, query_only) never wait behind the writer under WAL;
+    # size the pool so every web thread (including one streaming an
+    # NDJSON body, which holds its connection until the body ends), the
+    # per-request read fan-out and each background service's reads get
+    # one.  Writes stay on the ingestion/analyzer threads' own
+    # connections.
+    background_readers = sum(
+        svc.READ_CONNECTIONS
+        for svc in (rt.IngestionService, rt.WalletAnalyzer, rt.MarketAnalyzer)
+    )
+    db = rt.Database(
+        config.db_path,
+        read_pool_size=config.web_threads + rt.READ_FANOUT_WORKERS + background_readers,
+    )
     logger.info("Database ready: %s", config.db_path)
 
     # ---- Services ------------------------------------------------------
-    from services.analysis         import AnalysisService
-    from services.ingestion        import IngestionService
-    from services.polymarket_client import PolymarketClient
-    from services.wallet_analyzer  import WalletAnalyzer
-    from services.market_analyzer  import MarketAnalyzer
-    from services.scanner          import ScannerService
-
-    analysis        = AnalysisService(db, config.whale_threshold)
-    ingestion       = IngestionService(config, db)
-    poly_client     = PolymarketClient(config)
-    wallet_analyzer = WalletAnalyzer(config, db, poly_client)
-    market_analyzer = MarketAnalyzer(config, db, poly_client)
-    scanner         = ScannerService(config, db)
+    analysis        = rt.AnalysisService(db, config.whale_threshold)
+    ingestion       = rt.IngestionService(config, db)
+    poly_client     = rt.PolymarketClient(config)
+    wallet_analyzer = rt.WalletAnalyzer(config, db, poly_client)
+    if args.rebuild_wallets:
+        wallet_analyzer.request_rebuild()
+    market_analyzer = rt.MarketAnalyzer(config, db, poly_client)
+    scanner         = rt.ScannerService(config, db)
 
     # ---- Flask app -----------------------------------------------------
-    from app.app import create_app
-    app = create_app(
+    app = rt.create_app(
         config, db, analysis,
         ingestion=ingestion,
         wallet_analyzer=wallet_analyzer,
         market_analyzer=market_analyzer,
     )
 
-    # ---- Start background services ------------------------------------
-    ingestion.start()
-    logger.info("Ingestion service started — market=%s", config.market_id)
+    # ---- Background services ------------------------------------------
+    def start_services() -> None:
+        ingestion.start()
+        logger.info("Ingestion service started — market=%s", config.market_id)
 
-    wallet_analyzer.start()
-    market_analyzer.start()
-    scanner.start()
+        wallet_analyzer.start()
+        market_analyzer.start()
+        scanner.start()
 
-    # Allow the first poll to complete before serving the UI
-    time.sleep(2)
+        # Allow the first poll to complete before serving the UI
+        if not ingestion.first_poll_done.wait(timeout=10):
+            logger.warning("First poll still running after 10s — serving anyway")
 
-    # ---- Start Flask (blocks until Ctrl-C) -----------------------------
+    # ---- Serve (blocks until Ctrl-C) -----------------------------------
     url = f"http://{'localhost' if config.flask_host == '0.0.0.0' else config.flask_host}:{config.flask_port}"
     print(f"\n  Dashboard → {url}\n")
+
+    if not config.flask_debug:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            logger.warning("gunicorn not installed — falling back to the Flask dev server")
+        else:
+            logger.info(
+                "Starting gunicorn on %s:%d (%d threads)",
+                config.flask_host, config.flask_port, config.web_threads,
+            )
+            # The master forks the worker: SQLite connections must not
+            # cross fork(), so close the ones schema setup opened here.
+            # The worker reopens its own on first use.
+            db.close()
+            _serve_gunicorn(app, config, start_services)
+            return
+
+    start_services()
     logger.info("Starting Flask on %s:%d", config.flask_host, config.flask_port)
 
     app.run(
         host=config.flask_host,
         port=config.flask_port,
         debug=config.flask_debug,
+        threaded=True,
         use_reloader=False,   # reloader would duplicate ingestion threads
     )
 
-
 if __name__ == "__main__":
     main()
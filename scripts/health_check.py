@@ -4,7 +4,8 @@ scripts/health_check.py
 -----------------------
 Pre-flight validation for poly-analysis-v1.
 
-Run automatically by run.py before starting services, or manually:
+Run automatically (in-process, via run()) by run.py before starting
+services, or manually:
 
     python scripts/health_check.py
 
@@ -17,8 +18,11 @@ Exit codes
 import asyncio
 import importlib
 import os
-import sqlite3
+import ssl
 import sys
+import time
+from functools import lru_cache
+from urllib.parse import urlparse
 
 # ----------------------------------------------------------------
 # Ensure project root is on sys.path so local imports work
@@ -33,9 +37,23 @@ if _ROOT not in sys.path:
 _passed: list[str] = []
 _failed: list[str] = []
 
+# ANSI colour only when writing to a terminal
+_USE_COLOR = sys.stdout.isatty()
+_GREEN = "\033[32m" if _USE_COLOR else ""
+_RED   = "\033[31m" if _USE_COLOR else ""
+_RESET = "\033[0m"  if _USE_COLOR else ""
+
+
+@lru_cache(maxsize=1)
+def _load_env() -> bool:
+    """Load .env into os.environ once per process, shared by every check."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return True
+
 
 def _report(name: str, ok: bool, detail: str = ""):
-    symbol = "✅" if ok else "❌"
+    symbol = f"{_GREEN}[OK]{_RESET}  " if ok else f"{_RED}[FAIL]{_RESET}"
     line   = f"{symbol} {name}"
     if detail:
         line += f": {detail}"
@@ -49,10 +67,12 @@ def _report(name: str, ok: bool, detail: str = ""):
 def check_dependencies():
     packages = {
         "flask":      "flask",
+        "flask-orjson": "flask_orjson",
+        "msgpack":    "msgpack",
         "websockets": "websockets",
+        "aiohttp":    "aiohttp",
         "requests":   "requests",
         "dotenv":     "dotenv",
-        "colorama":   "colorama",
     }
     missing = []
     for label, module in packages.items():
@@ -70,7 +90,12 @@ def check_dependencies():
 # ================================================================
 # Helper — resolve market slug from Gamma API
 # ================================================================
-def _fetch_market_title(condition_id: str, data_api_url: str) -> str:
+_TITLE_CACHE_TTL = 24 * 3600   # market titles practically never change
+
+
+async def _fetch_market_title(
+    http, condition_id: str, data_api_url: str, cache_dir: str
+) -> str:
     """
     Return a human-readable title for the given condition ID.
 
@@ -78,35 +103,64 @@ def _fetch_market_title(condition_id: str, data_api_url: str) -> str:
     endpoint is correctly filtered by market and embeds title + slug in
     every record.  Falls back to slug if title is absent.
 
+    A title found is cached in `cache_dir` for _TITLE_CACHE_TTL, so
+    repeated runs (e.g. as a liveness probe) skip the request.
+
     Returns an empty string on any failure (non-fatal).
     """
     if not condition_id:
         return ""
+
+    import orjson
+    cache_path = os.path.join(cache_dir, f".title_cache_{condition_id}.json")
+    try:
+        if os.path.getmtime(cache_path) > time.time() - _TITLE_CACHE_TTL:
+            with open(cache_path, "rb") as fh:
+                return orjson.loads(fh.read())["title"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass   # missing, stale or unreadable: fetch
+
+    if http is None:
+        return ""
+    title = ""
     try:
-        import requests
-        resp = requests.get(
+        import aiohttp
+        async with http.get(
             f"{data_api_url}/trades",
             params={"market": condition_id, "limit": 1, "takerOnly": "false"},
-            timeout=8,
-        )
-        if resp.ok:
-            trades = resp.json()
-            if isinstance(trades, list) and trades:
-                t = trades[0]
-                return t.get("title") or t.get("slug") or ""
+            timeout=aiohttp.ClientTimeout(total=8),
+        ) as resp:
+            if resp.ok:
+                trades = orjson.loads(await resp.read())
+                if isinstance(trades, list) and trades:
+                    t = trades[0]
+                    title = t.get("title") or t.get("slug") or ""
     except Exception:
         pass
-    return ""
+
+    if title:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                fh.write(orjson.dumps({"title": title}))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass   # caching is best-effort
+    return title
 
 
 # ================================================================
 # Check 2 — Configuration / environment variables
 # ================================================================
-def check_config():
-    """Returns the Config object if valid, else None."""
+def load_config():
+    """
+    Load and validate the Config; returns it if valid, else None (the
+    failure is reported).  A valid config is reported by check_config
+    once the market title has been looked up.
+    """
     try:
-        from dotenv import load_dotenv
-        load_dotenv()
+        _load_env()
 
         from conf.config import Config
         cfg = Config.from_env()
@@ -116,17 +170,6 @@ def check_config():
             for e in errors:
                 _report("Configuration", False, e)
             return None
-
-        title = _fetch_market_title(cfg.market_id, cfg.data_api_url)
-        market_label = f"{cfg.market_id!r}"
-        if title:
-            market_label += f"  ({title})"
-
-        _report(
-            "Configuration",
-            True,
-            f"MARKET_ID={market_label}  FETCH_INTERVAL={cfg.fetch_interval}s  WHALE=${cfg.whale_threshold:,.0f}",
-        )
         return cfg
 
     except Exception as exc:
@@ -134,12 +177,26 @@ def check_config():
         return None
 
 
+async def check_config(cfg, http):
+    title = await _fetch_market_title(
+        http, cfg.market_id, cfg.data_api_url, cfg.output_dir
+    )
+    market_label = f"{cfg.market_id!r}"
+    if title:
+        market_label += f"  ({title})"
+
+    _report(
+        "Configuration",
+        True,
+        f"MARKET_ID={market_label}  FETCH_INTERVAL={cfg.fetch_interval}s  WHALE=${cfg.whale_threshold:,.0f}",
+    )
+
+
 # ================================================================
 # Check 3 — SQLite database
 # ================================================================
 def check_database(cfg):
-    from dotenv import load_dotenv
-    load_dotenv()
+    _load_env()
 
     db_path = (cfg.db_path if cfg else None) or os.getenv("DB_PATH", "output/trades.db")
     db_dir  = os.path.dirname(db_path)
@@ -148,18 +205,24 @@ def check_database(cfg):
         if db_dir:
             os.makedirs(db_dir, exist_ok=True)
 
-        # Basic connectivity
-        conn = sqlite3.connect(db_path)
-        conn.execute("SELECT 1")
-        conn.close()
-
-        # Schema check / creation
+        # One connection for the whole check: opening it applies the WAL /
+        # synchronous / cache PRAGMAs, and the schema query is the liveness
+        # probe
         from db import Database
         db = Database(db_path)
-        if db.verify_schema():
-            _report("SQLite Database", True, f"Schema OK — {db_path}")
-        else:
-            _report("SQLite Database", False, "Tables missing after schema creation attempt")
+        try:
+            if not db.verify_schema():
+                _report("SQLite Database", False, "Tables missing after schema creation attempt")
+                return
+
+            journal_mode = db.journal_mode()
+        finally:
+            db.close()
+        if journal_mode != "wal":
+            _report("SQLite Database", False, f"journal_mode={journal_mode}, expected wal")
+            return
+
+        _report("SQLite Database", True, f"Schema OK, WAL — {db_path}")
 
     except Exception as exc:
         _report("SQLite Database", False, str(exc))
@@ -169,8 +232,7 @@ def check_database(cfg):
 # Check 4 — File system write permissions
 # ================================================================
 def check_filesystem():
-    from dotenv import load_dotenv
-    load_dotenv()
+    _load_env()
 
     dirs = [
         os.getenv("OUTPUT_DIR", "output"),
@@ -196,19 +258,32 @@ def check_filesystem():
 # ================================================================
 # Check 5 — Polymarket REST API
 # ================================================================
-def check_rest_api():
-    try:
-        import requests
-        from dotenv import load_dotenv
-        load_dotenv()
+async def check_rest_api():
+    """
+    Reachability of the CLOB REST host: a TCP connect plus TLS handshake
+    (certificate verified) is enough, without sending an HTTP request.
+    """
+    _load_env()
 
-        base = os.getenv("CLOB_API_URL", "https://clob.polymarket.com")
-        resp = requests.get(f"{base}/ok", timeout=10)
-        resp.raise_for_status()
-        _report("Polymarket REST API", True, f"HTTP {resp.status_code} from {base}/ok")
+    base = os.getenv("CLOB_API_URL", "https://clob.polymarket.com")
+    url  = urlparse(base)
+    host = url.hostname or ""
+    port = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host, port,
+                ssl=ssl.create_default_context() if url.scheme == "https" else None,
+            ),
+            timeout=5,
+        )
+        writer.close()
+        await writer.wait_closed()
+        what = "TLS handshake" if url.scheme == "https" else "TCP connect"
+        _report("Polymarket REST API", True, f"{what} OK from {host}:{port}")
 
     except Exception as exc:
-        _report("Polymarket REST API", False, str(exc))
+        _report("Polymarket REST API", False, str(exc) or type(exc).__name__)
 
 
 # ================================================================
@@ -221,32 +296,63 @@ async def _ws_test(url: str) -> None:
         # Graceful close handled by context manager
 
 
-def check_websocket():
-    from dotenv import load_dotenv
-    load_dotenv()
+async def check_websocket():
+    _load_env()
 
     ws_url = os.getenv("WS_URL", "wss://ws-subscriptions-clob.polymarket.com/ws/market")
     try:
-        asyncio.run(_ws_test(ws_url))
+        await _ws_test(ws_url)
         _report("Polymarket WebSocket", True, f"Connected to {ws_url}")
     except Exception as exc:
         _report("Polymarket WebSocket", False, str(exc))
 
 
+async def _run_concurrent_checks(cfg) -> None:
+    """
+    Checks 2–6 overlap: the network checks wait on I/O together and the
+    local database / filesystem checks run in worker threads meanwhile,
+    so the wall time is the slowest check rather than the sum.  Results
+    are reported as each check finishes.  HTTP requests share one pooled
+    keep-alive session.
+    """
+    try:
+        import aiohttp
+        http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+        )
+    except ImportError:
+        http = None   # reported by check_dependencies
+
+    checks = [
+        asyncio.to_thread(check_database, cfg),
+        asyncio.to_thread(check_filesystem),
+        check_rest_api(),
+        check_websocket(),
+    ]
+    if cfg is not None:
+        checks.insert(0, check_config(cfg, http))
+    try:
+        await asyncio.gather(*checks)
+    finally:
+        if http is not None:
+            await http.close()
+
+
 # ================================================================
 # Entry point
 # ================================================================
-def main():
+def run() -> int:
+    """Run every check, print the report, and return the exit code."""
+    _passed.clear()
+    _failed.clear()
+
     print("─" * 52)
     print("  Pre-flight Health Check — poly-analysis-v1")
     print("─" * 52)
 
     check_dependencies()
-    cfg = check_config()
-    check_database(cfg)
-    check_filesystem()
-    check_rest_api()
-    check_websocket()
+    cfg = load_config()
+    asyncio.run(_run_concurrent_checks(cfg))
 
     print("─" * 52)
     total = len(_passed) + len(_failed)
@@ -257,7 +363,11 @@ def main():
         print("  — all good!")
     print("─" * 52)
 
-    sys.exit(0 if not _failed else 1)
+    return 0 if not _failed else 1
+
+
+def main():
+    sys.exit(run())
 
 
 if __name__ == "__main__":
@@ -10,7 +10,7 @@ lists suitable for JSON serialisation.
 
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from db import Database
 
@@ -31,34 +31,13 @@ class AnalysisService:
     def get_summary(self, market_id: Optional[str] = None) -> Dict:
         """Aggregate stats plus volume-by-outcome breakdown."""
         stats = self.db.get_stats(market_id)
-        volume_breakdown = self.db.get_volume_by_outcome(market_id)
-
-        # Reshape breakdown into {outcome: {buy, sell, …}} for easy JS access
-        by_outcome: Dict[str, Dict] = {}
-        for row in volume_breakdown:
-            outcome = row.get("outcome") or "Unknown"
-            if outcome not in by_outcome:
-                by_outcome[outcome] = {
-                    "outcome": outcome,
-                    "buy_volume": 0.0,
-                    "sell_volume": 0.0,
-                    "buy_count": 0,
-                    "sell_count": 0,
-                    "avg_price": 0.0,
-                }
-            side = row.get("side", "").upper()
-            if side == "BUY":
-                by_outcome[outcome]["buy_volume"] = row["volume"]
-                by_outcome[outcome]["buy_count"] = row["trade_count"]
-                by_outcome[outcome]["avg_price"] = row["avg_price"]
-            elif side == "SELL":
-                by_outcome[outcome]["sell_volume"] = row["volume"]
-                by_outcome[outcome]["sell_count"] = row["trade_count"]
+        # {outcome, buy_*, sell_*, avg_price} rows, pivoted by the DB
+        by_outcome = self.db.get_volume_pivot(market_id)
 
         return {
             **stats,
             "whale_threshold": self.whale_threshold,
-            "volume_by_outcome": list(by_outcome.values()),
+            "volume_by_outcome": by_outcome,
         }
 
     # ----------------------------------------------------------------
@@ -70,11 +49,12 @@ class AnalysisService:
         market_id: Optional[str] = None,
         limit: int = 50,
     ) -> List[Dict]:
-        """Trades above the whale threshold, newest first."""
+        """Trades above the whale threshold, newest first, classified."""
         return self.db.get_recent_trades(
             limit=limit,
             market_id=market_id,
             min_amount=self.whale_threshold,
+            whale_threshold=self.whale_threshold,
         )
 
     def get_recent_trades(
@@ -84,11 +64,45 @@ class AnalysisService:
         min_amount: Optional[float] = None,
         wallet: Optional[str] = None,
     ) -> List[Dict]:
+        """Recent trades, newest first, annotated with classify_trade's fields."""
         return self.db.get_recent_trades(
             limit=limit,
             market_id=market_id,
             min_amount=min_amount,
             wallet=wallet,
+            whale_threshold=self.whale_threshold,
+        )
+
+    def get_recent_trades_json(
+        self,
+        market_id: Optional[str] = None,
+        limit: int = 100,
+        min_amount: Optional[float] = None,
+        wallet: Optional[str] = None,
+    ) -> str:
+        """get_recent_trades pre-serialised to a JSON array by SQLite."""
+        return self.db.get_recent_trades_json(
+            limit=limit,
+            market_id=market_id,
+            min_amount=min_amount,
+            wallet=wallet,
+            whale_threshold=self.whale_threshold,
+        )
+
+    def iter_recent_trades(
+        self,
+        market_id: Optional[str] = None,
+        limit: int = 100,
+        min_amount: Optional[float] = None,
+        wallet: Optional[str] = None,
+    ) -> Iterator[Dict]:
+        """Streaming form of get_recent_trades (rows yielded from the cursor)."""
+        return self.db.iter_trades(
+            limit=limit,
+            market_id=market_id,
+            min_amount=min_amount,
+            wallet=wallet,
+            whale_threshold=self.whale_threshold,
         )
 
     # ----------------------------------------------------------------
@@ -99,12 +113,15 @@ class AnalysisService:
         self,
         market_id: Optional[str] = None,
         limit: int = 20,
+        after: Optional[Tuple[float, str]] = None,
     ) -> List[Dict]:
         """Top traders ranked by total USDC volume, with size classification."""
-        traders = self.db.get_top_traders(market_id=market_id, limit=limit)
-        for t in traders:
-            t["size_class"] = self._classify_size(t.get("total_volume") or 0)
-        return traders
+        return self.db.get_top_traders(
+            market_id=market_id,
+            limit=limit,
+            after=after,
+            whale_threshold=self.whale_threshold,
+        )
 
     # ----------------------------------------------------------------
     # Helpers
@@ -9,22 +9,27 @@ Two parallel channels:
      including wallet addresses and embedded trader profile info.
 
   2. WebSocket monitor — `ws-subscriptions-clob.polymarket.com/ws/market`.
-     Used for health-checking and real-time signalling.  Does NOT supply
-     wallet-level trade data on its own, so the REST poll remains the
-     authoritative source of truth.
+     Used for health-checking and real-time signalling: a trade event
+     triggers an immediate poll.  Does NOT supply wallet-level trade data
+     on its own, so the REST poll remains the authoritative source of truth.
 
-Both channels run in daemon threads so Flask can own the main thread.
+Both channels share one asyncio event loop in a single daemon thread, so
+Flask can own the main thread.  HTTP goes through a pooled keep-alive
+aiohttp session; blocking SQLite work runs on one dedicated DB thread.
 """
 
 import asyncio
-import json
+import contextlib
 import logging
 import time
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, Optional
 
-import requests
+import aiohttp
+import orjson
 import websockets
 from websockets.exceptions import ConnectionClosed, WebSocketException
 
@@ -33,6 +38,30 @@ from db import Database
 
 logger = logging.getLogger(__name__)
 
+# Seconds between Database.optimize() calls from the poll thread
+_OPTIMIZE_INTERVAL = 15 * 60
+
+# Seconds between WAL truncating checkpoints from the poll thread
+_CHECKPOINT_INTERVAL = 5 * 60
+
+# Minimum seconds between polls, bounding the rate of WebSocket-triggered
+# polls on a busy market (events in between coalesce into one poll)
+_MIN_POLL_GAP = 1.0
+
+# WebSocket event types that mean new trades exist upstream
+_TRADE_EVENTS = ("last_trade_price", "trade")
+
+# Raw side spellings → stored side; anything else is upper-cased
+_SIDE_MAP = {
+    "BUY": "BUY", "buy": "BUY", "Buy": "BUY",
+    "SELL": "SELL", "sell": "SELL", "Sell": "SELL",
+}
+
+# Stored transaction hashes remembered across polls.  Each poll re-sends
+# the latest 500 trades, so most of a page is already stored; known
+# hashes skip normalisation and the DB lookup entirely.
+_SEEN_MAX = 2000
+
 
 class IngestionService:
     """
@@ -41,7 +70,7 @@ class IngestionService:
     Usage::
 
         svc = IngestionService(config, db)
-        svc.start()   # spawns background threads; returns immediately
+        svc.start()   # spawns the background thread; returns immediately
         ...
         svc.stop()
     """
@@ -50,22 +79,45 @@ class IngestionService:
     _DEFAULT_DATA_API = "https://data-api.polymarket.com"
     _DEFAULT_WS_URL = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
 
+    # Pooled read connections this service's thread can hold at once
+    # (priming the seen-hash set); run.py reserves them in the read pool
+    READ_CONNECTIONS = 1
+
     def __init__(self, config: Config, db: Database):
         self.config = config
         self.db = db
+
+        # Request targets are fixed for the service's lifetime
+        data_api = config.data_api_url or self._DEFAULT_DATA_API
+        self._trades_url = f"{data_api}/trades"
+        self._trades_params = {"limit": 500, "takerOnly": "false"}
+        if config.market_id:
+            self._trades_params["market"] = config.market_id
+        self._ws_url = config.ws_url or self._DEFAULT_WS_URL
+
         self._running = False
         self._ws_connected = False
         self._poll_count = 0
         self._last_poll_ts: Optional[float] = None
         self._new_trades_total = 0
-
-        # Shared requests session (thread-safe for reads, not writes)
-        self._session = requests.Session()
-        self._session.headers.update(
-            {
-                "User-Agent": "poly-analysis-v1/1.0",
-                "Accept": "application/json",
-            }
+        # Set once the first poll cycle has finished (stored or failed),
+        # so startup can wait for initial data without a fixed sleep
+        self.first_poll_done = threading.Event()
+
+        # Created on the service's event loop by _main
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._poll_now: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._http: Optional[aiohttp.ClientSession] = None
+
+        # Recently stored transaction hashes, oldest first (LRU, bounded by
+        # _SEEN_MAX); only touched on the DB thread
+        self._seen_hashes: "OrderedDict[str, None]" = OrderedDict()
+
+        # sqlite3 calls block, so the loop hands DB work to this single
+        # thread (which also keeps the service to one write connection)
+        self._db_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ingestion-db"
         )
 
     # ----------------------------------------------------------------
@@ -73,7 +125,7 @@ class IngestionService:
     # ----------------------------------------------------------------
 
     def start(self):
-        """Spawn background threads and return immediately."""
+        """Spawn the background event-loop thread and return immediately."""
         if self._running:
             logger.warning("IngestionService.start() called while already running")
             return
@@ -81,14 +133,8 @@ class IngestionService:
         self._running = True
 
         threading.Thread(
-            target=self._poll_loop,
-            name="ingestion-poll",
-            daemon=True,
-        ).start()
-
-        threading.Thread(
-            target=self._ws_thread_main,
-            name="ingestion-ws",
+            target=self._thread_main,
+            name="ingestion",
             daemon=True,
         ).start()
 
@@ -100,6 +146,17 @@ class IngestionService:
 
     def stop(self):
         self._running = False
+        # Wake the loops so they exit now rather than after their sleeps
+        loop, stopping = self._loop, self._stopping
+        if loop is not None and stopping is not None:
+            try:
+                loop.call_soon_threadsafe(self._signal_stop)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def _signal_stop(self):
+        self._stopping.set()
+        self._poll_now.set()
 
     # ----------------------------------------------------------------
     # Properties for health reporting
@@ -121,57 +178,134 @@ class IngestionService:
     def new_trades_total(self) -> int:
         return self._new_trades_total
 
+    # ================================================================
+    # Event loop
+    # ================================================================
+
+    def _thread_main(self):
+        """Run the service's asyncio event loop in this thread."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        try:
+            loop.run_until_complete(self._main())
+        except Exception as exc:
+            logger.error("Ingestion thread fatal error: %s", exc, exc_info=True)
+        finally:
+            self._loop = None
+            loop.close()
+
+    async def _main(self):
+        """Open the HTTP session and run the poll and WebSocket loops until stop()."""
+        self._poll_now = asyncio.Event()
+        self._stopping = asyncio.Event()
+        if not self._running:
+            return  # stop() came before the loop was ready
+        connector = aiohttp.TCPConnector(
+            limit=20, keepalive_timeout=75, ttl_dns_cache=300
+        )
+        async with aiohttp.ClientSession(
+            connector=connector,
+            headers={
+                "User-Agent": "poly-analysis-v1/1.0",
+                "Accept": "application/json",
+            },
+            timeout=aiohttp.ClientTimeout(total=30),
+        ) as session:
+            self._http = session
+            ws_task = asyncio.create_task(self._ws_connect_loop())
+            try:
+                await self._poll_loop()
+            finally:
+                # stop() ends the poll loop; the WebSocket may be idle in
+                # a receive, so cancel it rather than wait for a message
+                ws_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await ws_task
+                self._ws_connected = False
+
+    async def _sleep(self, seconds: float):
+        """Sleep for *seconds*, returning early once stop() is called."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run_db(self, fn, *args):
+        """Run a blocking Database call on the ingestion DB thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._db_executor, fn, *args
+        )
+
     # ================================================================
     # REST Polling
     # ================================================================
 
-    def _poll_loop(self):
-        """Blocking loop: fetch trades, sleep, repeat."""
+    async def _poll_loop(self):
+        """Fetch trades every fetch_interval, or sooner on a WS trade event."""
         logger.info("Poll loop started")
 
+        try:
+            await self._run_db(self._prime_seen_hashes)
+        except Exception as exc:
+            logger.warning("Could not load recent trade hashes: %s", exc)
+
         # Do an immediate first fetch
-        self._safe_fetch()
+        await self._safe_fetch()
+        next_optimize = time.monotonic() + _OPTIMIZE_INTERVAL
+        next_checkpoint = time.monotonic() + _CHECKPOINT_INTERVAL
 
         while self._running:
-            # Sleep in 1-second increments so we can exit cleanly
-            deadline = time.monotonic() + self.config.fetch_interval
-            while self._running and time.monotonic() < deadline:
-                time.sleep(1)
+            # Sleep until the next poll is due; a WebSocket trade event or
+            # stop() sets _poll_now to wake the loop early
+            try:
+                await asyncio.wait_for(
+                    self._poll_now.wait(), timeout=self.config.fetch_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._poll_now.clear()
+
+            if self._running:
+                await self._safe_fetch()
+
+            # Keep planner statistics current as the trades table grows
+            if time.monotonic() >= next_optimize:
+                await self._run_db(self.db.optimize)
+                next_optimize = time.monotonic() + _OPTIMIZE_INTERVAL
+
+            # Bound the WAL file under sustained ingestion
+            if time.monotonic() >= next_checkpoint:
+                await self._run_db(self.db.checkpoint)
+                next_checkpoint = time.monotonic() + _CHECKPOINT_INTERVAL
 
             if self._running:
-                self._safe_fetch()
+                await self._sleep(_MIN_POLL_GAP)
 
-    def _safe_fetch(self):
+    async def _safe_fetch(self):
         """Wrap _fetch_and_store so a single failure doesn't kill the loop."""
         try:
-            self._fetch_and_store_trades()
+            await self._fetch_and_store_trades()
         except Exception as exc:
             logger.error("Unhandled error in fetch cycle: %s", exc, exc_info=True)
+        finally:
+            self.first_poll_done.set()
 
-    def _fetch_and_store_trades(self):
+    async def _fetch_and_store_trades(self):
         """Fetch the latest trades for the configured market and persist new ones."""
-        data_api = self.config.data_api_url or self._DEFAULT_DATA_API
-
         try:
-            resp = self._session.get(
-                f"{data_api}/trades",
-                params={
-                    "market": self.config.market_id,
-                    "limit": 500,
-                    "takerOnly": "false",
-                },
-                timeout=30,
-            )
-            resp.raise_for_status()
-        except requests.exceptions.Timeout:
+            async with self._http.get(self._trades_url, params=self._trades_params) as resp:
+                resp.raise_for_status()
+                # orjson: C parser, several times faster than json on
+                # the ~500 dict-heavy trade records per poll
+                payload = orjson.loads(await resp.read())
+        except asyncio.TimeoutError:
             logger.warning("Trade fetch timed out")
             return
-        except requests.exceptions.RequestException as exc:
+        except aiohttp.ClientError as exc:
             logger.error("Trade fetch failed: %s", exc)
             return
 
-        payload = resp.json()
-
         # data-api may return a list directly or wrap it
         if isinstance(payload, list):
             raw_trades = payload
@@ -181,25 +315,59 @@ class IngestionService:
             logger.warning("Unexpected trades response type: %s", type(payload))
             return
 
+        await self._run_db(self._store_trades, raw_trades)
+
+    def _store_trades(self, raw_trades: List[dict]):
+        """Persist one poll's trades (runs on the ingestion DB thread)."""
         if not raw_trades:
             logger.debug("No trades returned for market %s", self.config.market_id)
             self._last_poll_ts = time.time()
             self._poll_count += 1
             return
 
-        new_count = 0
+        # Normalise, skipping hashes already stored by an earlier poll and
+        # repeats within the page
+        seen = self._seen_hashes
+        pairs = []
+        hashes = set()
+        now = int(time.time())
         for raw in raw_trades:
-            trade = self._normalize_trade(raw)
+            tx_hash = raw.get("transactionHash") or raw.get("transaction_hash")
+            if tx_hash is not None:
+                if tx_hash in seen:
+                    seen.move_to_end(tx_hash)
+                    continue
+                if tx_hash in hashes:
+                    continue
+            trade = self._normalize_trade(raw, now)
             if not trade:
                 continue
+            if tx_hash is not None:
+                hashes.add(tx_hash)
+            pairs.append((trade, raw))
 
-            inserted = self.db.insert_trade(trade)
-            if inserted:
-                new_count += 1
-                # Persist trader profile embedded in the trade record
-                trader = self._normalize_trader(raw)
-                if trader:
-                    self.db.upsert_trader(trader)
+        # The whole poll is one transaction (one commit): look up which
+        # trades are already stored, then insert the new ones and upsert
+        # their embedded trader profiles with one executemany each
+        new_count = 0
+        if pairs:
+            with self.db.transaction():
+                existing = self.db.existing_trade_hashes(hashes)
+                new = [(t, raw) for t, raw in pairs if t["transaction_hash"] not in existing]
+                new_count = self.db.insert_trades(t for t, _ in new)
+                # One profile per wallet; the page is newest first, so the
+                # first occurrence is the most recent
+                traders: Dict[str, dict] = {}
+                for _, raw in new:
+                    trader = self._normalize_trader(raw)
+                    if trader and trader["proxy_wallet"] not in traders:
+                        traders[trader["proxy_wallet"]] = trader
+                if traders:
+                    self.db.upsert_traders(traders.values())
+
+            # Remember what is now stored; if any insert failed, only the
+            # hashes that were already there, so the rest are retried
+            self._remember_hashes(hashes if new_count == len(new) else existing)
 
         self._new_trades_total += new_count
         self._last_poll_ts = time.time()
@@ -219,14 +387,27 @@ class IngestionService:
                 len(raw_trades),
             )
 
+    def _prime_seen_hashes(self):
+        """Seed _seen_hashes with the most recent stored trades."""
+        hashes = self.db.get_recent_trade_hashes(_SEEN_MAX)
+        self._remember_hashes(reversed(hashes))
+
+    def _remember_hashes(self, hashes):
+        seen = self._seen_hashes
+        for tx_hash in hashes:
+            seen[tx_hash] = None
+        while len(seen) > _SEEN_MAX:
+            seen.popitem(last=False)
+
     # ----------------------------------------------------------------
     # Data normalisation
     # ----------------------------------------------------------------
 
-    def _normalize_trade(self, raw: dict) -> Optional[dict]:
+    def _normalize_trade(self, raw: dict, now: int) -> Optional[dict]:
         """
         Map a raw Data API trade response to the DB schema.
         Returns None if the record is missing required fields.
+        `now` stands in for a missing or unparseable timestamp.
         """
         try:
             # Wallet address — Data API returns proxyWallet
@@ -238,32 +419,40 @@ class IngestionService:
             if not wallet:
                 return None
 
+            side = raw.get("side", "")
+            side = _SIDE_MAP.get(side) if isinstance(side, str) else None
+            if side is None:
+                side = str(raw.get("side", "")).upper()
+
             price = float(raw.get("price") or 0)
             size = float(raw.get("size") or 0)
             amount = round(price * size, 6)
 
-            # Timestamp normalisation
+            # Timestamp normalisation: epoch seconds in practice, so that
+            # is tried first; ISO-8601 parsing is the slow fallback
             ts = raw.get("timestamp")
             if ts is None:
-                match_time = int(time.time())
+                match_time = now
             elif isinstance(ts, (int, float)):
                 match_time = int(ts)
             elif isinstance(ts, str):
                 try:
-                    # ISO-8601 string
-                    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-                    match_time = int(dt.timestamp())
+                    match_time = int(ts)
                 except ValueError:
-                    match_time = int(time.time())
+                    try:
+                        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+                        match_time = int(dt.timestamp())
+                    except ValueError:
+                        match_time = now
             else:
-                match_time = int(time.time())
+                match_time = now
 
             return {
                 "transaction_hash": raw.get("transactionHash") or raw.get("transaction_hash"),
                 "market_id": raw.get("conditionId") or raw.get("market") or self.config.market_id,
                 "token_id": raw.get("asset") or raw.get("asset_id"),
                 "proxy_wallet": wallet,
-                "side": str(raw.get("side", "")).upper(),
+                "side": side,
                 "price": price,
                 "size": size,
                 "amount": amount,
@@ -306,20 +495,9 @@ class IngestionService:
     # WebSocket Monitor
     # ================================================================
 
-    def _ws_thread_main(self):
-        """Run an asyncio event loop in this thread for the WebSocket."""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(self._ws_connect_loop())
-        except Exception as exc:
-            logger.error("WebSocket thread fatal error: %s", exc, exc_info=True)
-        finally:
-            loop.close()
-
     async def _ws_connect_loop(self):
         """Reconnect-forever WebSocket loop with exponential back-off."""
-        ws_url = self.config.ws_url or self._DEFAULT_WS_URL
+        ws_url = self._ws_url
         backoff = 5
 
         while self._running:
@@ -346,7 +524,7 @@ class IngestionService:
                 logger.error("WebSocket error: %s", exc, exc_info=True)
 
             if self._running:
-                await asyncio.sleep(backoff)
+                await self._sleep(backoff)
                 backoff = min(backoff * 2, 120)
 
         self._ws_connected = False
@@ -356,8 +534,8 @@ class IngestionService:
         Process incoming WebSocket messages.
 
         The CLOB market channel sends orderbook snapshots/updates.
-        We log event types for debugging; the REST poll is the
-        primary trade data source.
+        Trade events wake the poll loop for an immediate fetch; the REST
+        poll remains the primary trade data source.
         """
         async for message in ws:
             if not self._running:
@@ -367,13 +545,12 @@ class IngestionService:
                 continue
 
             try:
-                data = json.loads(message)
+                data = orjson.loads(message)
                 event_type = data.get("event_type") or data.get("type") or "unknown"
                 logger.debug("WS event_type=%s", event_type)
 
-                # Hook: extend here to trigger immediate poll on trade events
-                # if event_type in ("last_trade_price", "trade"):
-                #     self._safe_fetch()
+                if event_type in _TRADE_EVENTS:
+                    self._poll_now.set()
 
-            except (json.JSONDecodeError, AttributeError):
+            except (orjson.JSONDecodeError, AttributeError):
                 pass  # Non-JSON frames (e.g. plain-text PONG)
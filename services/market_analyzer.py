@@ -7,7 +7,8 @@ Runs every `config.market_analyzer_interval` seconds (default 3600s).
 
 Data source
 -----------
-Uses data-api /trades?market=<id>&limit=1 to get title + slug + icon.
+Uses data-api /trades?market=<id>,<id>,… to get title + slug + icon, many
+markets per request (PolymarketClient.get_market_info_batch).
 (gamma-api /markets?conditionId= does not filter correctly — do not use.)
 
 Extended fields (category, description, end_date, resolved, winning_outcome)
@@ -23,7 +24,7 @@ unnecessary API calls when the analyzer loop fires on its normal schedule.
 import logging
 import threading
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from conf.config import Config
@@ -38,11 +39,16 @@ _REFETCH_INTERVAL = 3_600   # seconds: skip market if fetched within last hour
 class MarketAnalyzer:
     """Keeps the `markets` table populated with metadata for tracked markets."""
 
+    # Pooled read connections a run holds at once; run.py reserves them
+    # in the read pool
+    READ_CONNECTIONS = 1
+
     def __init__(self, config: Config, db: Database, client: PolymarketClient):
         self.config   = config
         self.db       = db
         self.client   = client
         self._running  = False
+        self._stopped  = threading.Event()   # set by stop(); wakes the loop
         self._interval = config.market_analyzer_interval
 
         self._run_count    = 0
@@ -56,6 +62,7 @@ class MarketAnalyzer:
         if self._running:
             return
         self._running = True
+        self._stopped.clear()
         threading.Thread(
             target=self._loop,
             name="market-analyzer",
@@ -65,6 +72,7 @@ class MarketAnalyzer:
 
     def stop(self) -> None:
         self._running = False
+        self._stopped.set()
 
     @property
     def run_count(self) -> int:
@@ -80,12 +88,8 @@ class MarketAnalyzer:
 
     def _loop(self) -> None:
         self._safe_run()
-        while self._running:
-            deadline = time.monotonic() + self._interval
-            while self._running and time.monotonic() < deadline:
-                time.sleep(1)
-            if self._running:
-                self._safe_run()
+        while not self._stopped.wait(self._interval):
+            self._safe_run()
 
     def _safe_run(self) -> None:
         try:
@@ -94,33 +98,21 @@ class MarketAnalyzer:
             logger.error("MarketAnalyzer unhandled error: %s", exc, exc_info=True)
 
     def _run_once(self) -> None:
-        condition_ids = self.db.get_distinct_markets_from_trades()
-        if not condition_ids:
-            logger.debug("MarketAnalyzer: no markets in trades table yet")
-            return
+        now = datetime.now(timezone.utc)
+        now_iso = now.isoformat()
+
+        # Traded markets never fetched, or not within the last hour
+        cutoff = now - timedelta(seconds=_REFETCH_INTERVAL)
+        stale = self.db.get_stale_market_ids(cutoff.isoformat())
+
+        infos = self.client.get_market_info_batch(stale) if stale else {}
 
-        updated = 0
-        skipped = 0
-        now_iso = datetime.now(timezone.utc).isoformat()
-
-        for cid in condition_ids:
-            # Skip if we fetched this market recently
-            existing = self.db.get_market(cid)
-            if existing and existing.get("last_fetched"):
-                try:
-                    last = datetime.fromisoformat(existing["last_fetched"])
-                    age_s = (datetime.now(timezone.utc) - last).total_seconds()
-                    if age_s < _REFETCH_INTERVAL:
-                        skipped += 1
-                        continue
-                except (ValueError, TypeError):
-                    pass
-
-            info = self.client.get_market_info(cid)
-
-            # Always upsert even if info is None, so we record last_fetched
-            # and don't retry within the next hour.
-            self.db.upsert_market({
+        # Always upsert even if info is None, so we record last_fetched
+        # and don't retry within the next hour.
+        rows = []
+        for cid in stale:
+            info = infos.get(cid)
+            rows.append({
                 "condition_id":   cid,
                 "title":          info.get("title")   if info else None,
                 "slug":           info.get("slug")    if info else None,
@@ -132,11 +124,13 @@ class MarketAnalyzer:
                 "winning_outcome": None,
                 "last_fetched":   now_iso,
             })
-            updated += 1
+        if rows:
+            self.db.upsert_markets(rows)
+        updated = len(rows)
 
         self._run_count += 1
         self._last_run_ts = time.time()
         logger.info(
-            "MarketAnalyzer run #%d: updated %d, skipped %d markets",
-            self._run_count, updated, skipped,
+            "MarketAnalyzer run #%d: updated %d markets",
+            self._run_count, updated,
         )
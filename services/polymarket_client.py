@@ -5,9 +5,14 @@ Thin REST wrapper around the Polymarket public APIs.
 
 Design
 ------
-- Single shared requests.Session with a threading.Lock-based rate limiter.
-- 1 request/second global limit (safe margin for public endpoints).
-- Up to 3 retries with exponential back-off on transient errors.
+- Single shared requests.Session (keep-alive connection pool per host) with
+  a rate limiter per API host.
+- 1 request/second per host (safe margin for public endpoints); data-api
+  and gamma-api are separate services, so calls to one never wait on the
+  other.
+- Up to 3 retries with jittered exponential back-off (capped at 30s) on
+  transient errors; a Retry-After header is honoured, and a 429 defers
+  every caller of that host, not just the one retrying.
 - All methods return plain dicts / None — never raise.
 - Callers (wallet_analyzer, market_analyzer) must tolerate None returns.
 
@@ -16,39 +21,84 @@ Known API constraints
 - gamma-api /markets?conditionId=  does NOT filter — returns arbitrary rows.
   Use data-api /trades?market=<id>&limit=1 to get market title/slug instead.
 - gamma-api /profiles?address=<addr> returns a list; empty list = no profile.
+- data-api /trades?market= accepts a comma-separated list of condition IDs.
 """
 
 import logging
+import random
 import threading
 import time
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlsplit
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 from conf.config import Config
 
 logger = logging.getLogger(__name__)
 
 
+class _HostRateLimiter:
+    """Spaces calls to one host at least `interval` seconds apart (thread-safe)."""
+
+    __slots__ = ("interval", "_lock", "_next_at")
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock    = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self) -> None:
+        """Claim the next free slot, then sleep until it — outside the lock."""
+        with self._lock:
+            now = time.monotonic()
+            at  = max(now, self._next_at)
+            self._next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+    def defer(self, seconds: float) -> None:
+        """Hold back every caller's next slot until `seconds` from now."""
+        with self._lock:
+            self._next_at = max(self._next_at, time.monotonic() + seconds)
+
+
 class PolymarketClient:
     """Thread-safe Polymarket REST client with rate limiting."""
 
     _RETRY_STATUSES = {429, 500, 502, 503, 504}
     _MAX_RETRIES    = 3
+    _MAX_BACKOFF    = 30.0   # seconds
+
+    # get_market_info_batch: condition IDs per request (~67 chars each in
+    # the query string) and trades fetched to cover them
+    _MARKET_BATCH       = 40
+    _MARKET_BATCH_LIMIT = 500
 
     def __init__(self, config: Config):
         self._data_api  = config.data_api_url
         self._gamma_api = config.gamma_api_url
 
         self._session = requests.Session()
+        # One kept-alive pool per API host (data-api, gamma-api), each
+        # with room for the analyzer threads sharing this client.  Retries
+        # stay in _get, so the adapter itself never retries.
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=0)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
         self._session.headers.update(
             {"User-Agent": "poly-analysis-v1/1.0", "Accept": "application/json"}
         )
 
-        # Rate limiting: 1 req/sec across all callers / threads
-        self._rate_lock      = threading.Lock()
-        self._last_call_time = 0.0
-        self._min_interval   = 1.0  # seconds
+        # Rate limiting: 1 req/sec per host across all callers / threads
+        self._min_interval = 1.0  # seconds
+        self._limiters: Dict[str, _HostRateLimiter] = {
+            urlsplit(api).netloc: _HostRateLimiter(self._min_interval)
+            for api in (self._data_api, self._gamma_api)
+        }
+        self._limiters_lock = threading.Lock()
 
     # ----------------------------------------------------------------
     # Public interface
@@ -74,12 +124,49 @@ class PolymarketClient:
         if not isinstance(data, list) or not data:
             return None
 
-        t = data[0]
+        return self._market_info(condition_id, data[0])
+
+    def get_market_info_batch(self, condition_ids: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """
+        get_market_info for many condition IDs, keyed by condition ID.
+
+        Each request asks data-api for the latest trades of up to
+        _MARKET_BATCH markets at once (comma-separated `market`), taking
+        the first trade seen per market.  A market whose trades are
+        crowded out of that page by busier ones falls back to its own
+        get_market_info call.
+        """
+        cids = [cid for cid in dict.fromkeys(condition_ids) if cid]
+        result: Dict[str, Optional[Dict]] = {}
+
+        for i in range(0, len(cids), self._MARKET_BATCH):
+            chunk = cids[i:i + self._MARKET_BATCH]
+            data = self._get(
+                f"{self._data_api}/trades",
+                params={
+                    "market": ",".join(chunk),
+                    "limit": self._MARKET_BATCH_LIMIT,
+                    "takerOnly": "false",
+                },
+            )
+            wanted = set(chunk)
+            for t in data if isinstance(data, list) else ():
+                cid = t.get("conditionId") if isinstance(t, dict) else None
+                if cid in wanted and cid not in result:
+                    result[cid] = self._market_info(cid, t)
+
+        for cid in cids:
+            if cid not in result:
+                result[cid] = self.get_market_info(cid)
+        return result
+
+    @staticmethod
+    def _market_info(condition_id: str, trade: Dict) -> Dict:
         return {
             "condition_id": condition_id,
-            "title": t.get("title"),
-            "slug":  t.get("slug"),
-            "icon":  t.get("icon"),
+            "title": trade.get("title"),
+            "slug":  trade.get("slug"),
+            "icon":  trade.get("icon"),
         }
 
     def get_trader_profile(self, wallet_address: str) -> Optional[Dict]:
@@ -118,40 +205,61 @@ class PolymarketClient:
     # Internal HTTP
     # ----------------------------------------------------------------
 
-    def _rate_wait(self) -> None:
-        """Block until 1 second has passed since the last request."""
-        with self._rate_lock:
-            now     = time.monotonic()
-            elapsed = now - self._last_call_time
-            if elapsed < self._min_interval:
-                time.sleep(self._min_interval - elapsed)
-            self._last_call_time = time.monotonic()
+    def _limiter(self, url: str) -> _HostRateLimiter:
+        """The rate limiter for url's host."""
+        host = urlsplit(url).netloc
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            with self._limiters_lock:
+                limiter = self._limiters.setdefault(
+                    host, _HostRateLimiter(self._min_interval)
+                )
+        return limiter
+
+    @staticmethod
+    def _retry_after(resp) -> Optional[float]:
+        """Seconds from a numeric Retry-After header, or None."""
+        try:
+            return max(0.0, float(resp.headers.get("Retry-After")))
+        except (TypeError, ValueError):
+            return None   # absent, or the HTTP-date form
 
     def _get(self, url: str, params: dict = None) -> Optional[object]:
         """
         Execute a GET with rate limiting and retry logic.
         Returns parsed JSON (dict or list) or None on failure.
         """
+        limiter = self._limiter(url)
         backoff = 2.0
         for attempt in range(self._MAX_RETRIES + 1):
-            self._rate_wait()
+            limiter.wait()
             try:
                 resp = self._session.get(url, params=params, timeout=15)
 
                 if resp.status_code in self._RETRY_STATUSES and attempt < self._MAX_RETRIES:
+                    # Full jitter keeps retrying threads from stampeding
+                    # together; the server's Retry-After wins when given
+                    wait = self._retry_after(resp)
+                    if wait is None:
+                        wait = random.uniform(0, backoff)
                     logger.warning(
-                        "HTTP %d from %s — retry %d/%d in %.0fs",
-                        resp.status_code, url, attempt + 1, self._MAX_RETRIES, backoff,
+                        "HTTP %d from %s — retry %d/%d in %.1fs",
+                        resp.status_code, url, attempt + 1, self._MAX_RETRIES, wait,
                     )
-                    time.sleep(backoff)
-                    backoff *= 2
+                    if resp.status_code == 429:
+                        # Rate-limited: the next limiter.wait() sleeps it
+                        # out, and so does every other caller of this host
+                        limiter.defer(wait)
+                    else:
+                        time.sleep(wait)
+                    backoff = min(backoff * 2, self._MAX_BACKOFF)
                     continue
 
                 if not resp.ok:
                     logger.debug("HTTP %d from %s (not retrying)", resp.status_code, url)
                     return None
 
-                return resp.json()
+                return orjson.loads(resp.content)
 
             except requests.exceptions.Timeout:
                 logger.warning("Timeout fetching %s (attempt %d)", url, attempt + 1)
@@ -162,8 +270,8 @@ class PolymarketClient:
                 return None  # bad JSON — no point retrying
 
             if attempt < self._MAX_RETRIES:
-                time.sleep(backoff)
-                backoff *= 2
+                time.sleep(random.uniform(0, backoff))
+                backoff = min(backoff * 2, self._MAX_BACKOFF)
 
         logger.error("All retries exhausted for %s", url)
         return None
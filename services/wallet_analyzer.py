@@ -8,15 +8,20 @@ background daemon thread.
 
 What it does each cycle
 -----------------------
-1. Collect all distinct wallet addresses from the trades table.
+1. Collect the wallets with trades not yet analyzed (wallets.last_trade_id
+   records how far each wallet's stats go).
 2. For each wallet:
-   a. Pull all trades (oldest-first) from the trades table.
-   b. Compute aggregate stats (volume, trade count, first/last seen, etc.).
-   c. Compute per-position FIFO PnL → write to positions table.
-   d. Sum realized PnL across positions.
-   e. Resolve profile: traders table → wallets table → Gamma API (at most
-      once per 24h per wallet to stay within rate limits).
-   f. Upsert the wallets row with fresh metrics.
+   a. Stream its new trades (oldest-first) from the trades table.
+   b. In that single pass, fold them into the stored aggregate stats
+      (volume, trade count, first/last seen, etc.) and per-position FIFO
+      PnL, resuming each position's open lots → positions table.
+   c. Sum realized PnL across positions.
+   d. Resolve profile: traders table → wallets table → Gamma API (at most
+      once per 24h per wallet to stay within rate limits).  Gamma lookups
+      run on a background thread while the scan continues.
+   e. Upsert the wallets row with fresh metrics.  Wallet and position
+      rows are buffered and written in batches, one transaction each.
+3. Write the fetched Gamma profiles onto their wallet rows in one batch.
 
 FIFO PnL notes
 --------------
@@ -25,14 +30,19 @@ FIFO PnL notes
 - "Orphaned" sells (buys before our ingestion window) are logged at
   DEBUG level but excluded from realized PnL to avoid inflated numbers.
 - `win_rate` is set to None until Phase 3 provides market resolution data.
+- Trades are applied in the order they are analyzed: one ingested late,
+  with an older match_time than trades already applied, is matched after
+  them.  request_rebuild() (run.py --rebuild-wallets) recomputes every
+  wallet from its full history in match_time order.
 """
 
 import logging
 import threading
 import time
-from collections import defaultdict, deque
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from conf.config import Config
 from db import Database
@@ -43,20 +53,35 @@ logger = logging.getLogger(__name__)
 # Minimum seconds between Gamma API profile calls for the same wallet
 _PROFILE_CACHE_TTL = 86_400  # 24 hours
 
+# Wallet + position rows buffered before one upsert transaction
+_UPSERT_BATCH_ROWS = 5000
+
 
 class WalletAnalyzer:
     """Aggregates trades → wallets + positions on a recurring schedule."""
 
+    # Pooled read connections a run holds at once: the streaming trade
+    # scan plus a get_wallet_state lookup inside it.  run.py reserves
+    # them in the read pool.
+    READ_CONNECTIONS = 2
+
     def __init__(self, config: Config, db: Database, client: PolymarketClient):
         self.config  = config
         self.db      = db
         self.client  = client
         self._running = False
+        self._stopped = threading.Event()   # set by stop(); wakes the loop
         self._interval = config.wallet_analyzer_interval
 
-        # Track last Gamma API attempt per wallet (in-memory, resets on restart)
+        # Last Gamma API attempt per wallet (epoch s); seeded each run from
+        # wallets.last_profile_attempt
         self._profile_attempted: Dict[str, float] = {}
 
+        # trades.id every wallet's stats are current to after the last
+        # complete run; None until a run completes in this process
+        self._after_id: Optional[int] = None
+        self._rebuild = False
+
         # Stats for status reporting
         self._run_count    = 0
         self._last_run_ts: Optional[float] = None
@@ -69,6 +94,7 @@ class WalletAnalyzer:
         if self._running:
             return
         self._running = True
+        self._stopped.clear()
         threading.Thread(
             target=self._loop,
             name="wallet-analyzer",
@@ -78,6 +104,11 @@ class WalletAnalyzer:
 
     def stop(self) -> None:
         self._running = False
+        self._stopped.set()
+
+    def request_rebuild(self) -> None:
+        """Recompute every wallet from its full trade history on the next run."""
+        self._rebuild = True
 
     @property
     def run_count(self) -> int:
@@ -94,12 +125,8 @@ class WalletAnalyzer:
     def _loop(self) -> None:
         # Immediate first run
         self._safe_run()
-        while self._running:
-            deadline = time.monotonic() + self._interval
-            while self._running and time.monotonic() < deadline:
-                time.sleep(1)
-            if self._running:
-                self._safe_run()
+        while not self._stopped.wait(self._interval):
+            self._safe_run()
 
     def _safe_run(self) -> None:
         try:
@@ -108,55 +135,162 @@ class WalletAnalyzer:
             logger.error("WalletAnalyzer unhandled error: %s", exc, exc_info=True)
 
     def _run_once(self) -> None:
-        wallets = self.db.get_distinct_wallets_from_trades()
-        if not wallets:
-            logger.debug("WalletAnalyzer: no wallets in trades table yet")
-            return
-
-        processed = 0
-        for address in wallets:
-            try:
-                self._process_wallet(address)
-                processed += 1
-            except Exception as exc:
-                logger.warning("WalletAnalyzer: error processing %s: %s", address, exc)
+        # The trades each wallet's stats don't cover yet, from one ordered
+        # scan, folded into its stored state; every stored profile from one
+        # query.  The resulting rows are upserted in batches of
+        # _UPSERT_BATCH_ROWS
+        rebuild, self._rebuild = self._rebuild, False
+        upto_id = self.db.get_max_trade_id()   # later inserts wait for the next run
+        if rebuild:
+            logger.info("WalletAnalyzer: rebuilding every wallet from its full history")
+            after_id, watermarks = None, {}
+        else:
+            after_id, watermarks = self._after_id or 0, self.db.get_wallet_watermarks()
+        profiles = self.db.get_known_profiles()
+        # Gamma attempts persist on the wallet rows, so the per-wallet TTL
+        # survives restarts
+        attempted = self._profile_attempted
+        for address, ts in self.db.get_profile_attempts().items():
+            if ts > attempted.get(address, 0.0):
+                attempted[address] = ts
+        wallet_rows: List[Dict] = []
+        position_rows: List[Dict] = []
+        seen = updated = 0
+        complete = True   # every wallet seen was written
+        # Gamma lookups are network-bound and rate-limited: one background
+        # thread works through them while the scan and FIFO math go on,
+        # instead of the scan stalling on each lookup
+        fetches: Dict[str, Future] = {}
+        now_iso = datetime.now(timezone.utc).isoformat()   # last_updated for the run
+        pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wallet-profiles")
+        try:
+            for address, trades in self.db.iter_trades_grouped_by_wallet(upto_id, after_id):
+                seen += 1
+                try:
+                    state = self.db.get_wallet_state(address) if address in watermarks else None
+                    rows = self._process_wallet(
+                        address, trades, state, upto_id, now_iso, profiles, pool, fetches
+                    )
+                except Exception as exc:
+                    logger.warning("WalletAnalyzer: error processing %s: %s", address, exc)
+                    complete = False
+                    continue
+                if rows is None:
+                    continue
+                wallet_rows.append(rows[0])
+                position_rows.extend(rows[1])
+                if len(wallet_rows) + len(position_rows) >= _UPSERT_BATCH_ROWS:
+                    written = self._flush(wallet_rows, position_rows)
+                    updated += written
+                    complete = complete and written > 0
+            if wallet_rows:
+                written = self._flush(wallet_rows, position_rows)
+                updated += written
+                complete = complete and written > 0
+            self._store_fetched_profiles(fetches)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        # A wallet that failed, or whose batch didn't commit, keeps its old
+        # last_trade_id, so its trades are picked up again next run
+        if complete:
+            self._after_id = upto_id
 
         self._run_count += 1
         self._last_run_ts = time.time()
+        if not seen:
+            logger.debug("WalletAnalyzer: no new trades since the last run")
+            return
         logger.info(
-            "WalletAnalyzer run #%d: processed %d/%d wallets",
-            self._run_count, processed, len(wallets),
+            "WalletAnalyzer run #%d: updated %d/%d wallets with new trades",
+            self._run_count, updated, seen,
         )
 
+    def _flush(self, wallet_rows: List[Dict], position_rows: List[Dict]) -> int:
+        """
+        Upsert and clear the buffered rows in one transaction (one commit).
+        Returns the number of wallets written: all of them, or 0 if the
+        transaction rolled back, leaving every wallet's stats, positions
+        and last_trade_id as they were.
+        """
+        written = len(wallet_rows)
+        try:
+            with self.db.transaction():
+                self.db.upsert_wallets(wallet_rows)
+                # A position whose market isn't fetched yet would otherwise
+                # fail its foreign key and lose its FIFO state
+                self.db.ensure_markets({r["condition_id"] for r in position_rows})
+                self.db.upsert_positions(position_rows)
+        except Exception as exc:
+            logger.error(
+                "WalletAnalyzer: writing %d wallets failed, retrying next run: %s",
+                written, exc,
+            )
+            written = 0
+        wallet_rows.clear()
+        position_rows.clear()
+        return written
+
+    def _store_fetched_profiles(self, fetches: Dict[str, Future]) -> None:
+        """
+        Wait for this run's Gamma lookups and write them onto the (already
+        upserted) wallet rows, recording each attempt.  On stop(), the
+        remaining lookups are abandoned (_run_once cancels them) and
+        retried next run.
+        """
+        rows = []
+        for address, future in fetches.items():
+            if not self._running:
+                break
+            try:
+                profile = future.result() or {}
+            except Exception as exc:
+                logger.warning("WalletAnalyzer: profile lookup failed for %s: %s", address, exc)
+                profile = {}
+            now = time.time()
+            self._profile_attempted[address] = now
+            rows.append({
+                "address":              address,
+                "name":                 profile.get("name"),
+                "pseudonym":            profile.get("pseudonym"),
+                "profile_image":        profile.get("profile_image"),
+                "bio":                  profile.get("bio"),
+                "last_profile_attempt": now,
+            })
+        if rows:
+            self.db.update_wallet_profiles(rows)
+
     # ----------------------------------------------------------------
     # Per-wallet processing
     # ----------------------------------------------------------------
 
-    def _process_wallet(self, address: str) -> None:
-        trades = self.db.get_trades_for_wallet(address)
-        if not trades:
-            return
-
-        # 1. Aggregate stats
-        stats = _aggregate_stats(trades)
-
-        # 2. Compute positions + FIFO PnL
-        positions = _compute_positions(trades, address)
-
-        # 3. Count open positions
-        active_count = sum(
-            1 for p in positions.values() if p["net_shares"] > 1e-6
-        )
-
-        # 4. Total realized PnL
-        total_pnl = sum(p["realized_pnl"] for p in positions.values())
+    def _process_wallet(
+        self,
+        address: str,
+        trades: Iterable[Tuple],
+        state: Optional[Tuple[Optional[Dict], List[Dict]]],
+        last_trade_id: int,
+        now_iso: str,
+        profiles: Dict[str, Dict],
+        pool: ThreadPoolExecutor,
+        fetches: Dict[str, Future],
+    ) -> Optional[Tuple[Dict, List[Dict]]]:
+        """
+        The wallet row and the rows of the positions `trades` touched, or
+        None if there are no trades.  `state` is the wallet's stored state
+        (Database.get_wallet_state), None to start from scratch.
+        """
+        # 1–4. Aggregate stats, per-position FIFO PnL, open positions and
+        # total realized PnL, in one pass over the streamed trades
+        stats, positions = _analyze_trades(trades, address, state)
+        if stats is None:
+            return None
 
         # 5. Profile enrichment
-        profile = self._resolve_profile(address)
+        profile = self._resolve_profile(address, profiles, pool, fetches)
 
-        # 6. Upsert wallet row
-        now_iso = datetime.now(timezone.utc).isoformat()
-        self.db.upsert_wallet({
+        # 6. Wallet row.  Rows are written by _run_once in batches; a
+        # profile still being fetched is written after the scan.
+        wallet_row = {
             "address":           address,
             "name":              profile.get("name"),
             "pseudonym":         profile.get("pseudonym"),
@@ -170,15 +304,17 @@ class WalletAnalyzer:
             "total_sell_volume": stats["total_sell_volume"],
             "largest_trade":     stats["largest_trade"],
             "avg_trade_size":    stats["avg_trade_size"],
-            "num_active_positions": active_count,
+            "num_active_positions": stats["num_active_positions"],
             "win_rate":          None,   # Phase 3
-            "realized_pnl":      total_pnl,
+            "realized_pnl":      stats["realized_pnl"],
             "last_updated":      now_iso,
-        })
+            "last_profile_attempt": self._profile_attempted.get(address),
+            "last_trade_id":     last_trade_id,
+        }
 
-        # 7. Upsert each position
-        for (condition_id, outcome), pos in positions.items():
-            self.db.upsert_position({
+        # 7. Position rows
+        position_rows = [
+            {
                 "wallet_address": address,
                 "condition_id":   condition_id,
                 "outcome":        outcome,
@@ -188,52 +324,44 @@ class WalletAnalyzer:
                 "total_sold":     pos["total_sold"],
                 "realized_pnl":   pos["realized_pnl"],
                 "last_updated":   now_iso,
-            })
+                "fifo_state":     pos["fifo_state"],
+            }
+            for (condition_id, outcome), pos in positions.items()
+        ]
+        return wallet_row, position_rows
 
     # ----------------------------------------------------------------
     # Profile enrichment
     # ----------------------------------------------------------------
 
-    def _resolve_profile(self, address: str) -> Dict:
+    def _resolve_profile(
+        self,
+        address: str,
+        profiles: Dict[str, Dict],
+        pool: ThreadPoolExecutor,
+        fetches: Dict[str, Future],
+    ) -> Dict:
         """
         Return profile dict with keys: name, pseudonym, profile_image, bio.
 
         Resolution order:
-          1. traders table (populated by ingestion from trade metadata)
-          2. wallets table (previously fetched and cached)
-          3. Gamma API (rate-limited to once per 24h per wallet)
+          1–2. `profiles` (Database.get_known_profiles): the traders table,
+               populated by ingestion from trade metadata, then the
+               wallets table, previously fetched and cached
+          3.   Gamma API (rate-limited to once per 24h per wallet): the
+               lookup is queued on `pool` into `fetches` and an empty
+               profile returned for now
         """
-        # 1. traders table (ingestion keeps this fresh)
-        trader = self.db.get_trader(address)
-        if trader and (trader.get("name") or trader.get("pseudonym")):
-            return {
-                "name":          trader.get("name"),
-                "pseudonym":     trader.get("pseudonym"),
-                "profile_image": trader.get("profile_image"),
-                "bio":           trader.get("bio"),
-            }
-
-        # 2. wallets table (our own previous enrichment)
-        existing = self.db.get_wallet(address)
-        if existing and (existing.get("name") or existing.get("pseudonym")):
-            return {
-                "name":          existing.get("name"),
-                "pseudonym":     existing.get("pseudonym"),
-                "profile_image": existing.get("profile_image"),
-                "bio":           existing.get("bio"),
-            }
+        known = profiles.get(address)
+        if known:
+            return known
 
         # 3. Gamma API — throttled per wallet
-        now = time.time()
         last_attempt = self._profile_attempted.get(address, 0.0)
-        if now - last_attempt < _PROFILE_CACHE_TTL:
+        if time.time() - last_attempt < _PROFILE_CACHE_TTL:
             return {}   # already tried recently, wait until TTL expires
 
-        self._profile_attempted[address] = now
-        api_data = self.client.get_trader_profile(address)
-        if api_data:
-            return api_data
-
+        fetches[address] = pool.submit(self.client.get_trader_profile, address)
         return {}
 
 
@@ -241,97 +369,197 @@ class WalletAnalyzer:
 # Pure functions (no DB/network access)
 # ================================================================
 
-def _aggregate_stats(trades: List[Dict]) -> Dict:
-    amounts = [float(t["amount"]) for t in trades]
-    total   = sum(amounts)
-    return {
-        "first_seen":        min(int(t["match_time"]) for t in trades),
-        "last_seen":         max(int(t["match_time"]) for t in trades),
-        "total_trades":      len(trades),
-        "total_volume":      total,
-        "total_buy_volume":  sum(float(t["amount"]) for t in trades if t["side"] == "BUY"),
-        "total_sell_volume": sum(float(t["amount"]) for t in trades if t["side"] == "SELL"),
-        "largest_trade":     max(amounts) if amounts else 0.0,
-        "avg_trade_size":    total / len(amounts) if amounts else 0.0,
-    }
-
-
-def _compute_positions(
-    trades: List[Dict],
+def _analyze_trades(
+    trades: Iterable[Tuple],
     address: str,
-) -> Dict[Tuple[str, str], Dict]:
+    state: Optional[Tuple[Optional[Dict], List[Dict]]] = None,
+) -> Tuple[Optional[Dict], Dict[Tuple[str, str], Dict]]:
     """
-    Group trades by (market_id, outcome) and compute FIFO PnL per group.
-    `trades` must be sorted oldest-first (get_trades_for_wallet guarantees this).
+    Fold trades into a wallet's aggregate stats and per-(market_id,
+    outcome) FIFO PnL in a single pass.
+    `trades` are (proxy_wallet, market_id, outcome, side, price, size,
+    amount, match_time) tuples sorted oldest-first, with numeric price /
+    size / amount / match_time (iter_trades_grouped_by_wallet guarantees
+    both); they are unpacked straight into locals, and consumed
+    lazily, so no trade outlives its own step.  `state` is
+    the wallet's stored (wallet row, position rows) to continue from, as
+    returned by Database.get_wallet_state; None starts from scratch.
+    Returns the stats, including num_active_positions and realized_pnl
+    over all the wallet's positions, and the positions the trades touched.
+    Stats are None when there are no trades.
     """
-    groups: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
-    for t in trades:
-        key = (t["market_id"], t.get("outcome") or "Unknown")
-        groups[key].append(t)
-
-    return {key: _fifo_pnl(group, address, key[0], key[1])
-            for key, group in groups.items()}
+    prior, prior_positions = state or (None, [])
+    positions: Dict[Tuple[str, str], _FifoPosition] = {}
+    for row in prior_positions:
+        pos = _FifoPosition.restore(address, row)
+        positions[(pos.condition_id, pos.outcome)] = pos
+    touched: Dict[Tuple[str, str], _FifoPosition] = {}
+
+    count = 0
+    if prior:
+        total      = prior["total_volume"]
+        buy_total  = prior["total_buy_volume"]
+        sell_total = prior["total_sell_volume"]
+        largest    = prior["largest_trade"]
+    else:
+        total = buy_total = sell_total = 0.0
+        largest = float("-inf")
+    first_seen = last_seen = None
+
+    for _, market_id, outcome, side, price, size, amount, match_time in trades:
+        count += 1
+        total += amount
+        if side == "BUY":
+            buy_total += amount
+        elif side == "SELL":
+            sell_total += amount
+        if amount > largest:
+            largest = amount
+        if count == 1:
+            first_seen = match_time   # oldest-first
+        last_seen = match_time
+
+        key = (market_id, outcome or "Unknown")
+        pos = touched.get(key)
+        if pos is None:
+            pos = positions.get(key)
+            if pos is None:
+                pos = positions[key] = _FifoPosition(address, *key)
+            touched[key] = pos
+        pos.add(side, size, price, amount)
+
+    if not count:
+        return None, {}
+    if prior:
+        count     += prior["total_trades"]
+        first_seen = min(first_seen, prior["first_seen"])
+        last_seen  = max(last_seen, prior["last_seen"])
+    stats = {
+        "first_seen":        first_seen,
+        "last_seen":         last_seen,
+        "total_trades":      count,
+        "total_volume":      total,
+        "total_buy_volume":  buy_total,
+        "total_sell_volume": sell_total,
+        "largest_trade":     largest,
+        "avg_trade_size":    total / count,
+        "num_active_positions": sum(
+            1 for pos in positions.values()
+            if pos.total_buy_shares - pos.total_sell_shares > 1e-6
+        ),
+        "realized_pnl":      sum(pos.realized_pnl for pos in positions.values()),
+    }
+    return stats, {key: pos.result() for key, pos in touched.items()}
 
 
-def _fifo_pnl(
-    trades: List[Dict],
-    address: str,
-    condition_id: str,
-    outcome: str,
-) -> Dict:
+class _FifoPosition:
     """
-    FIFO realized PnL for one (wallet, market, outcome) position.
-
-    Cost queue stores (shares_remaining, price_per_share) tuples.
+    Running FIFO realized PnL for one (wallet, market, outcome) position.
+
+    The cost queue is two parallel lists, shares remaining and price per
+    share, with `lot_head` indexing the oldest open lot: consuming a lot
+    advances the index and a partial fill rewrites one float, so no tuple
+    is built per match.  Consumed lots are dropped once they make up most
+    of the lists.  Between runs the share totals and the open lots are
+    stored as positions.fifo_state (state() / restore()).
     Realized PnL = sum of matched * (sell_price - buy_price) for each sell.
     """
-    buy_queue:         deque  = deque()   # (shares, price_per_share)
-    total_buy_shares:  float  = 0.0
-    total_buy_usdc:    float  = 0.0
-    total_sell_shares: float  = 0.0
-    total_sell_usdc:   float  = 0.0
-    realized_pnl:      float  = 0.0
-
-    for t in trades:
-        size   = float(t["size"])
-        price  = float(t["price"])
-        amount = float(t["amount"])
-
-        if t["side"] == "BUY":
-            buy_queue.append((size, price))
-            total_buy_shares += size
-            total_buy_usdc   += amount
-
-        elif t["side"] == "SELL":
-            total_sell_shares += size
-            total_sell_usdc   += amount
-            remaining          = size
-
-            while remaining > 1e-9 and buy_queue:
-                lot_shares, lot_price = buy_queue[0]
-                matched        = min(lot_shares, remaining)
-                realized_pnl  += matched * (price - lot_price)
-                lot_shares    -= matched
-                remaining     -= matched
-                if lot_shares < 1e-9:
-                    buy_queue.popleft()
+
+    __slots__ = (
+        "address", "condition_id", "outcome",
+        "lot_shares", "lot_prices", "lot_head",
+        "total_buy_shares", "total_buy_usdc",
+        "total_sell_shares", "total_sell_usdc", "realized_pnl",
+    )
+
+    def __init__(self, address: str, condition_id: str, outcome: str):
+        self.address      = address
+        self.condition_id = condition_id
+        self.outcome      = outcome
+        self.lot_shares:        List[float] = []
+        self.lot_prices:        List[float] = []
+        self.lot_head:          int    = 0
+        self.total_buy_shares:  float  = 0.0
+        self.total_buy_usdc:    float  = 0.0
+        self.total_sell_shares: float  = 0.0
+        self.total_sell_usdc:   float  = 0.0
+        self.realized_pnl:      float  = 0.0
+
+    @classmethod
+    def restore(cls, address: str, row: Dict) -> "_FifoPosition":
+        """Resume a position from its positions row (Database.get_wallet_state)."""
+        pos = cls(address, row["condition_id"], row["outcome"])
+        pos.total_buy_usdc  = row["total_bought"]
+        pos.total_sell_usdc = row["total_sold"]
+        pos.realized_pnl    = row["realized_pnl"]
+        if row["fifo_state"]:
+            state = array("d")
+            state.frombytes(row["fifo_state"])
+            n_lots = (len(state) - 2) // 2
+            pos.total_buy_shares  = state[0]
+            pos.total_sell_shares = state[1]
+            pos.lot_shares = state[2:2 + n_lots].tolist()
+            pos.lot_prices = state[2 + n_lots:].tolist()
+        return pos
+
+    def state(self) -> bytes:
+        """Share totals, then open lots' shares, then their prices, as packed doubles."""
+        head  = self.lot_head
+        state = array("d", (self.total_buy_shares, self.total_sell_shares))
+        state.extend(self.lot_shares[head:])
+        state.extend(self.lot_prices[head:])
+        return state.tobytes()
+
+    def add(self, side: str, size: float, price: float, amount: float) -> None:
+        if side == "BUY":
+            self.lot_shares.append(size)
+            self.lot_prices.append(price)
+            self.total_buy_shares += size
+            self.total_buy_usdc   += amount
+
+        elif side == "SELL":
+            self.total_sell_shares += size
+            self.total_sell_usdc   += amount
+            remaining               = size
+            lot_shares              = self.lot_shares
+            lot_prices              = self.lot_prices
+            head                    = self.lot_head
+            n_lots                  = len(lot_shares)
+
+            while remaining > 1e-9 and head < n_lots:
+                shares = lot_shares[head]
+                if shares <= remaining:
+                    self.realized_pnl += shares * (price - lot_prices[head])
+                    remaining         -= shares
+                    head              += 1
                 else:
-                    buy_queue[0] = (lot_shares, lot_price)
+                    self.realized_pnl += remaining * (price - lot_prices[head])
+                    shares            -= remaining
+                    remaining          = 0.0
+                    if shares < 1e-9:
+                        head += 1
+                    else:
+                        lot_shares[head] = shares
+
+            if head > 1024 and 2 * head > n_lots:
+                del lot_shares[:head], lot_prices[:head]
+                head = 0
+            self.lot_head = head
 
             if remaining > 1e-9:
                 # Orphaned sell — bought before our ingestion window
                 logger.debug(
                     "Orphaned sell %.4f shares: wallet=%s market=%s outcome=%s",
-                    remaining, address, condition_id, outcome,
+                    remaining, self.address, self.condition_id, self.outcome,
                 )
 
-    net_shares  = max(0.0, total_buy_shares - total_sell_shares)
-    avg_entry   = total_buy_usdc / total_buy_shares if total_buy_shares > 1e-9 else 0.0
-
-    return {
-        "net_shares":      net_shares,
-        "avg_entry_price": avg_entry,
-        "total_bought":    total_buy_usdc,
-        "total_sold":      total_sell_usdc,
-        "realized_pnl":    realized_pnl,
-    }
+    def result(self) -> Dict:
+        buy_shares = self.total_buy_shares
+        return {
+            "net_shares":      max(0.0, buy_shares - self.total_sell_shares),
+            "avg_entry_price": self.total_buy_usdc / buy_shares if buy_shares > 1e-9 else 0.0,
+            "total_bought":    self.total_buy_usdc,
+            "total_sold":      self.total_sell_usdc,
+            "realized_pnl":    self.realized_pnl,
+            "fifo_state":      self.state(),
+        }